@@ -1,9 +1,14 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
 import os, time
+from contextlib import asynccontextmanager
 
+from apis.pool import pool
+from apis import cache, archive, history, rollups
+from apis.utils import RawBody
+from apis.responses import ORJSONResponse, ORJSONRoute
 from apis.sources import transtar, metro_gtfsrt, bcycle_gbfs, usgs_water, ndbc, nws_nowcast, aviation, aqicn, airnow, purpleair
 
 DEMO = os.environ.get("DEMO_MODE","true").lower() == "true"
@@ -16,11 +21,27 @@ tags = [
     {"name":"Marine","description":"NOAA NDBC"},
     {"name":"Weather","description":"NWS + nowCOAST radar"},
     {"name":"Aviation","description":"Aviation Weather Center"},
-    {"name":"Air Quality","description":"AirNow, PurpleAir, AQICN"}
+    {"name":"Air Quality","description":"AirNow, PurpleAir, AQICN"},
+    {"name":"History","description":"DuckDB queries over the Parquet feed archive"}
 ]
 
-app = FastAPI(title="Houston Live Data Proxy", version="3.1", openapi_tags=tags,
+@asynccontextmanager
+async def lifespan(app):
+    if archive.ARCHIVE_ENABLED:
+        archive.archiver.start()
+        rollups.store.start()
+    yield
+    await archive.archiver.aclose()
+    await rollups.store.aclose()
+    await metro_gtfsrt.vehicle_stream.aclose()
+    await nws_nowcast.aclose()
+    await cache.aclose()
+    await pool.aclose()
+
+app = FastAPI(title="Houston Live Data Proxy", version="3.1", openapi_tags=tags, lifespan=lifespan,
+              default_response_class=ORJSONResponse,
               description="DEMO_MODE is {}. Set DEMO_MODE=false to require keys for all endpoints.".format(DEMO))
+app.router.route_class = ORJSONRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -46,8 +67,21 @@ async def m(request, call_next):
     REQS.labels(request.url.path, request.method, str(status)).inc()
     return resp
 
+def passthrough(result):
+    """Return a cached upstream body as-is; error dicts still go through JSON encoding."""
+    if isinstance(result, RawBody):
+        return Response(content=result.content, media_type=result.media_type)
+    return result
+
+def streamed(result):
+    """Stream a history.Result; error dicts still go through JSON encoding."""
+    if isinstance(result, history.Result):
+        return StreamingResponse(result.body, media_type=result.media_type)
+    return result
+
 @app.get("/metrics")
 def metrics():
+    pool.update_metrics()
     return PlainTextResponse(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/health")
@@ -57,29 +91,75 @@ def health():
 # Traffic
 @app.get("/transtar/speedsegments", tags=["Traffic"])
 async def transtar_speedsegments():
-    return await transtar.get_speedsegments()
+    return passthrough(await transtar.get_speedsegments(raw=True))
 
 @app.get("/transtar/incidents", tags=["Traffic"])
 async def transtar_incidents():
-    return await transtar.get_incidents()
+    return passthrough(await transtar.get_incidents(raw=True))
 
 @app.get("/transtar/lane_closures", tags=["Traffic"])
 async def transtar_lane_closures():
-    return await transtar.get_lane_closures()
+    return passthrough(await transtar.get_lane_closures(raw=True))
 
 @app.get("/transtar/roadway_flood_warnings", tags=["Traffic"])
 async def transtar_flood_warnings():
-    return await transtar.get_flood_warnings()
+    return passthrough(await transtar.get_flood_warnings(raw=True))
 
 # Transit
 @app.get("/metro/vehicle_positions", tags=["Transit"])
-async def metro_vehicle_positions():
+async def metro_vehicle_positions(route_id: str | None = None, bbox: str | None = None, fields: str | None = None):
+    """Full decoded feed, or with route_id=, bbox=minlon,minlat,maxlon,maxlat or fields= a flat filtered list."""
+    if route_id or bbox or fields:
+        return await metro_gtfsrt.vehicle_snapshot(route_id, bbox, fields)
     return await metro_gtfsrt.get_vehicle_positions()
 
+@app.get("/metro/vehicle_positions/stream", tags=["Transit"])
+async def metro_vehicle_positions_stream():
+    """Server-sent events: a `snapshot` of all vehicles on connect, then `delta` events with changed/removed ids."""
+    if not metro_gtfsrt.VEHICLE_POS_URL:
+        return {"error": "Set METRO_VEHICLE_POS_URL env to your GTFS‑rt endpoint"}
+    return StreamingResponse(metro_gtfsrt.vehicle_stream.subscribe(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/metro/trip_updates", tags=["Transit"])
 async def metro_trip_updates():
     return await metro_gtfsrt.get_trip_updates()
 
+@app.get("/metro/stop_arrivals", tags=["Transit"])
+async def metro_stop_arrivals(stop_id: str, limit: int = 10, after: int | None = None):
+    """Next predicted arrivals at one stop (after= epoch seconds, default now), from an index built per feed refresh."""
+    return await metro_gtfsrt.stop_arrivals(stop_id, limit, after)
+
+# History (DuckDB over the Parquet archive); format=ndjson|arrow
+@app.get("/history/sources", tags=["History"])
+def history_sources():
+    """Archived sources with their first/last partition day (runs in the threadpool: it lists the archive)."""
+    return history.sources()
+
+@app.get("/history/purpleair/pm25", tags=["History"])
+async def history_purpleair_pm25(days: float = 30, bucket: str = "hour", q: float = 0.5, sensor_index: int | None = None,
+                                 format: str = "ndjson", limit: int = history.HISTORY_MAX_ROWS):
+    """PM2.5 percentile `q` per sensor per `bucket` over the archived PurpleAir region."""
+    return streamed(await history.purpleair_pm25(days, bucket, q, sensor_index, format, limit))
+
+@app.get("/history/rollups/{source}", tags=["History"])
+async def history_rollups(source: str, tier: str = "hour", metric: str = "pm25", device: str | None = None,
+                          days: float = 7, format: str = "ndjson", limit: int = history.HISTORY_MAX_ROWS):
+    """Per-device count/min/max/mean/p50/p90/p99 of `metric` per `tier` bucket (5min|hour|day)."""
+    return streamed(await rollups.store.query(source, tier, metric, device, days, format, limit))
+
+@app.get("/history/{source}/counts", tags=["History"])
+async def history_counts(source: str, group_by: str | None = None, bucket: str = "week", distinct: str | None = None,
+                         days: float = 30, format: str = "ndjson", limit: int = history.HISTORY_MAX_ROWS):
+    """Rows, or distinct `distinct` values, per `bucket` and `group_by` column, e.g. incidents per roadway per week."""
+    return streamed(await history.counts(source, group_by, bucket, distinct, days, format, limit))
+
+@app.get("/history/{source}/rows", tags=["History"])
+async def history_rows(source: str, days: float = 1, columns: str | None = None, format: str = "ndjson",
+                       limit: int = history.HISTORY_MAX_ROWS):
+    """Raw archived rows for the last `days` days, optionally only `columns`, oldest first."""
+    return streamed(await history.rows(source, days, columns, format, limit))
+
 # Bike share
 @app.get("/bcycle/station_status", tags=["Bike Share"])
 async def bcycle_station_status():
@@ -88,25 +168,52 @@ async def bcycle_station_status():
 # Hydrology
 @app.get("/usgs/sites", tags=["Hydrology"])
 async def usgs_sites(county_code: str = "201", state: str = "TX"):
-    return await usgs_water.list_sites(state=state, county=county_code)
+    return passthrough(await usgs_water.list_sites(state=state, county=county_code, raw=True))
 
 @app.get("/usgs/timeseries", tags=["Hydrology"])
 async def usgs_timeseries(site: str, parameter: str = "00065", period: str = "P1D"):
-    return await usgs_water.get_timeseries(site, parameter, period)
+    return passthrough(await usgs_water.get_timeseries(site, parameter, period, raw=True))
+
+@app.get("/usgs/sites/stream", tags=["Hydrology"])
+async def usgs_sites_stream(county_code: str = "201", state: str = "TX"):
+    """Every page of sites (following OGC `next` links) as NDJSON, one site per line."""
+    return StreamingResponse(usgs_water.stream_sites(state, county_code), media_type="application/x-ndjson")
+
+@app.get("/usgs/timeseries/stream", tags=["Hydrology"])
+async def usgs_timeseries_stream(sites: str, parameter: str = "00065", period: str = "P30D"):
+    """All pages for one or more sites as NDJSON; each line is {site, unit, time[], value[], approval_status[]}."""
+    return StreamingResponse(usgs_water.stream_timeseries(sites, parameter, period), media_type="application/x-ndjson")
+
+@app.get("/usgs/timeseries/batch", tags=["Hydrology"])
+async def usgs_timeseries_batch(sites: str, parameter: str = "00065", period: str = "P1D"):
+    """sites=08074000,08073600: fetched concurrently, merged by site with per-site errors."""
+    return await usgs_water.get_timeseries_many(sites, parameter, period)
 
 # Marine
 @app.get("/ndbc/latest", tags=["Marine"])
-async def ndbc_latest(station: str = "42035"):
-    return await ndbc.fetch_latest(station)
+async def ndbc_latest(station: str = "42035", raw: bool = False):
+    """Typed latest observation (missing values are null); raw=true also returns the NOAA text."""
+    return await ndbc.fetch_latest(station, raw)
+
+@app.get("/ndbc/latest/batch", tags=["Marine"])
+async def ndbc_latest_batch(stations: str = "42035,42019"):
+    """stations=42035,42019: fetched concurrently, merged by station with per-station errors."""
+    return await ndbc.fetch_latest_many(stations)
+
+@app.get("/ndbc/history", tags=["Marine"])
+async def ndbc_history(station: str = "42035", hours: float = 24, fields: str | None = None):
+    """Observations this proxy has already seen for a station, as columns plus min/max/mean/slope per field."""
+    return ndbc.get_history(station, hours, fields)
 
 # Weather & radar
 @app.get("/nws/forecast", tags=["Weather"])
 async def nws_forecast(lat: float, lon: float):
+    """Forecast for the NWS gridpoint covering lat,lon; gridpoints are resolved once per ~1 km cell and persisted."""
     return await nws_nowcast.get_forecast(lat, lon)
 
 @app.get("/nws/alerts", tags=["Weather"])
 async def nws_alerts(area: str = "TXZ213"):
-    return await nws_nowcast.get_alerts(area)
+    return passthrough(await nws_nowcast.get_alerts(area, raw=True))
 
 @app.get("/radar/tilespec", tags=["Weather"])
 async def radar_tilespec():
@@ -117,6 +224,11 @@ async def radar_tilespec():
 async def aviation_metar(icao: str = "KIAH"):
     return await aviation.get_metar(icao)
 
+@app.get("/aviation/metar/batch", tags=["Aviation"])
+async def aviation_metar_batch(ids: str = "KIAH,KHOU"):
+    """ids=KIAH,KHOU: one upstream request, reports grouped by station."""
+    return await aviation.get_metars(ids)
+
 # Air Quality
 @app.get("/aqicn/city", tags=["Air Quality"])
 async def aqicn_city(city: str = "Houston"):
@@ -128,12 +240,23 @@ async def airnow_obs(zipcode: str = "77002"):
 
 @app.get("/purpleair/sensor", tags=["Air Quality"])
 async def purpleair_sensor(sensor_index: int):
-    return await purpleair.sensor(sensor_index)
+    return passthrough(await purpleair.sensor(sensor_index, raw=True))
 
 @app.get("/purpleair/search_bbox", tags=["Air Quality"])
 async def purpleair_search_bbox(nwlat: float = 30.20, nwlon: float = -95.90, selat: float = 29.40, selon: float = -94.90):
-    return await purpleair.search_bbox(nwlat, nwlon, selat, selon)
+    return passthrough(await purpleair.search_bbox(nwlat, nwlon, selat, selon, raw=True))
+
+@app.get("/purpleair/nearest", tags=["Air Quality"])
+async def purpleair_nearest(lat: float = 29.76, lon: float = -95.37, n: int = 10):
+    """The n sensors closest to a point, from the indexed PURPLEAIR_REGION snapshot."""
+    return await purpleair.nearest(lat, lon, n)
 
 @app.get("/purpleair/top_sensors", tags=["Air Quality"])
 async def purpleair_top_sensors(nwlat: float = 30.20, nwlon: float = -95.90, selat: float = 29.40, selon: float = -94.90, limit: int = 20):
     return await purpleair.top_sensors(nwlat, nwlon, selat, selon, limit)
+
+@app.get("/purpleair/aggregates", tags=["Air Quality"])
+async def purpleair_aggregates(nwlat: float = 30.20, nwlon: float = -95.90, selat: float = 29.40, selon: float = -94.90,
+                               field: str = "pm2.5_atm", percentiles: str = "50,90,99"):
+    """Mean/median/percentiles of one sensor field over a bbox; for pm2.5_atm also counts at or above each AQI breakpoint."""
+    return await purpleair.aggregates(nwlat, nwlon, selat, selon, field, percentiles)
@@ -0,0 +1,262 @@
+import os, json, time, uuid, random, asyncio, logging
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from pathlib import Path
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+from prometheus_client import Counter
+from apis.sources import transtar, nws_nowcast, purpleair, metro_gtfsrt, usgs_water, ndbc
+
+logger = logging.getLogger("houston")
+
+# Run the archiver inside the API process (or as a sidecar: python scripts/archive_feeds.py)
+ARCHIVE_ENABLED = os.environ.get("ARCHIVE_ENABLED","false").lower() == "true"
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR","data_parquet")
+# Buffered rows are written once a source has this many, or its oldest buffered row is this old
+ARCHIVE_ROW_GROUP = int(os.environ.get("ARCHIVE_ROW_GROUP","50000"))
+ARCHIVE_FLUSH_SECONDS = float(os.environ.get("ARCHIVE_FLUSH_SECONDS","600"))
+# Merge small files in each partition this often ("0" disables in-process compaction)
+ARCHIVE_COMPACT_SECONDS = float(os.environ.get("ARCHIVE_COMPACT_SECONDS","3600"))
+# Today's partition is only compacted once it has this many files; earlier days whenever they have two
+ARCHIVE_COMPACT_MIN_FILES = int(os.environ.get("ARCHIVE_COMPACT_MIN_FILES","24"))
+ARCHIVE_USGS_SITES = os.environ.get("ARCHIVE_USGS_SITES","08074000")
+ARCHIVE_NDBC_STATIONS = os.environ.get("ARCHIVE_NDBC_STATIONS","42035")
+ARCHIVE_NWS_ZONE = os.environ.get("ARCHIVE_NWS_ZONE","TXZ213")
+
+RECORDS = Counter("archive_records_total", "Records buffered by the feed archiver", ["source"])
+FILES = Counter("archive_files_total", "Parquet files written by the feed archiver", ["source"])
+ERRORS = Counter("archive_errors_total", "Feed archiver poll/write failures", ["source"])
+
+def _records(data) -> list:
+    """The list of items in a feed document: the document itself, or its first list-valued member."""
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        return next((v for v in data.values() if isinstance(v, list)), [data])
+    return []
+
+def _flat(record: dict) -> dict:
+    """Scalars as-is, nested values as JSON text, so one feed keeps one Parquet schema."""
+    return {k: v if v is None or isinstance(v, (str, int, float, bool)) else orjson.dumps(v).decode()
+            for k, v in record.items()}
+
+def _checked(data):
+    if isinstance(data, dict) and "error" in data:
+        return None  # source not configured (missing key/URL)
+    return data
+
+async def _transtar(fetch):
+    data = _checked(await fetch())
+    return None if data is None else [r for r in _records(data) if isinstance(r, dict)]
+
+async def _nws_alerts():
+    data = await nws_nowcast.get_alerts(ARCHIVE_NWS_ZONE)
+    return [{"id": f.get("id"), **(f.get("properties") or {})} for f in data.get("features", ())]
+
+async def _purpleair():
+    grid = _checked(await purpleair.region_grid())
+    return None if grid is None else grid.table
+
+async def _metro_vehicles():
+    if not metro_gtfsrt.VEHICLE_POS_URL:
+        return None
+    return (await metro_gtfsrt.feed(metro_gtfsrt.VEHICLE_POS_URL)).vehicles
+
+async def _metro_trips():
+    if not metro_gtfsrt.TRIP_UPDATES_URL:
+        return None
+    d = await metro_gtfsrt.feed(metro_gtfsrt.TRIP_UPDATES_URL)
+    return [{"trip_id": tu["trip_id"], "route_id": tu["route_id"], "stop_id": s["stop_id"],
+             "arrival": s["arrival"], "departure": s["departure"]}
+            for e in d.result["entities"] if (tu := e.get("trip_update")) for s in tu["stops"]]
+
+async def _usgs():
+    out = await usgs_water.get_timeseries_many(ARCHIVE_USGS_SITES, "00065", "PT1H")
+    return [{"site": s["site"], "parameter_code": s["parameter_code"], "unit": s["unit"], "time": t, "value": v}
+            for fc in out.get("results", {}).values() for s in usgs_water.compact_observations(fc.get("features", ()))
+            for t, v in zip(s["time"], s["value"])]
+
+async def _ndbc():
+    out = await ndbc.fetch_latest_many(ARCHIVE_NDBC_STATIONS)
+    return [{"station": k, **v["observation"]} for k, v in out.get("results", {}).items()]
+
+@dataclass(frozen=True)
+class Source:
+    name: str
+    interval: float
+    collect: object  # async () -> list[dict] | pa.Table | None (None: not configured)
+
+SOURCES = [
+    Source("transtar.incidents", 300, lambda: _transtar(transtar.get_incidents)),
+    Source("transtar.lane_closures", 300, lambda: _transtar(transtar.get_lane_closures)),
+    Source("transtar.flood_warnings", 300, lambda: _transtar(transtar.get_flood_warnings)),
+    Source("transtar.speedsegments", 120, lambda: _transtar(transtar.get_speedsegments)),
+    Source("nws.alerts", 300, _nws_alerts),
+    Source("purpleair.region", 600, _purpleair),
+    Source("metro.vehicle_positions", 30, _metro_vehicles),
+    Source("metro.trip_updates", 60, _metro_trips),
+    Source("usgs.observations", 900, _usgs),
+    Source("ndbc.latest", 600, _ndbc),
+]
+
+# Poll intervals in seconds by source name; 0 disables, e.g. ARCHIVE_SOURCES_JSON={"metro.vehicle_positions": 15}
+archive_sources_json = os.environ.get("ARCHIVE_SOURCES_JSON","{}")
+try:
+    _intervals = json.loads(archive_sources_json)
+    SOURCES = [replace(s, interval=float(_intervals.get(s.name, s.interval))) for s in SOURCES]
+except Exception as e:
+    logger.warning("ignoring invalid ARCHIVE_SOURCES_JSON: %s", e)
+
+def _day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+
+def _write(path: Path, tables: list, row_group: int) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        table = pa.concat_tables(tables, promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # a feed changed a column's type mid-batch: keep the polls in separate files
+        for i, t in enumerate(tables):
+            _write(path.with_name(f"{path.stem}-{i}{path.suffix}"), [t], row_group)
+        return len(tables)
+    tmp = path.with_suffix(".tmp")
+    pq.write_table(table, tmp, row_group_size=row_group, compression="zstd")
+    os.replace(tmp, path)  # readers and compaction only ever see complete files
+    return 1
+
+class Archiver:
+    """Polls each Source on its own schedule and appends Parquet files under
+    root/source=<name>/date=<UTC day>/, a Hive layout DuckDB and pyarrow read directly.
+
+    Polls go through the same cached, rate-limited fetchers as the API, and
+    file writes run in worker threads, so the request path never waits on it.
+    """
+
+    def __init__(self, root: str = ARCHIVE_DIR, sources=SOURCES, row_group: int = ARCHIVE_ROW_GROUP,
+                 flush_seconds: float = ARCHIVE_FLUSH_SECONDS, compact_seconds: float = ARCHIVE_COMPACT_SECONDS):
+        self.root = Path(root)
+        self.sources = [s for s in sources if s.interval > 0]
+        self.row_group = row_group
+        self.flush_seconds = flush_seconds
+        self.compact_seconds = compact_seconds
+        self._buffers: dict[tuple[str, str], list] = {}  # (source, day) -> tables
+        self._oldest: dict[tuple[str, str], float] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    async def poll(self, source: Source, now: float | None = None):
+        data = await source.collect()
+        if data is None:
+            return 0
+        now = time.time() if now is None else now
+        table = data if isinstance(data, pa.Table) else pa.Table.from_pylist([_flat(r) for r in data])
+        if table.num_rows == 0:
+            return 0
+        table = table.append_column("fetched_at", pa.array([int(now)] * table.num_rows, pa.int64()))
+        key = (source.name, _day(now))
+        self._buffers.setdefault(key, []).append(table)
+        self._oldest.setdefault(key, now)
+        RECORDS.labels(source.name).inc(table.num_rows)
+        await self.flush(now=now)
+        return table.num_rows
+
+    async def flush(self, force: bool = False, now: float | None = None):
+        now = time.time() if now is None else now
+        for key in list(self._buffers):
+            tables = self._buffers[key]
+            if not (force or key[1] != _day(now) or sum(t.num_rows for t in tables) >= self.row_group
+                    or now - self._oldest[key] >= self.flush_seconds):
+                continue
+            del self._buffers[key], self._oldest[key]
+            name, day = key
+            path = self.root / f"source={name}" / f"date={day}" / f"{int(now)}-{uuid.uuid4().hex[:8]}.parquet"
+            try:
+                FILES.labels(name).inc(await asyncio.to_thread(_write, path, tables, self.row_group))
+            except Exception as e:
+                ERRORS.labels(name).inc()
+                logger.warning("archive write for %s failed: %s", name, e)
+
+    async def _run(self, source: Source):
+        await asyncio.sleep(random.uniform(0, min(source.interval, 30)))  # spread the first polls out
+        while True:
+            try:
+                await self.poll(source)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                ERRORS.labels(source.name).inc()
+                logger.warning("archive poll for %s failed: %s", source.name, e)
+            await asyncio.sleep(source.interval)
+
+    async def _compact_loop(self):
+        while True:
+            await asyncio.sleep(self.compact_seconds)
+            try:
+                await asyncio.to_thread(compact, self.root)
+            except Exception as e:
+                logger.warning("archive compaction failed: %s", e)
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.ensure_future(self._run(s)) for s in self.sources]
+        if self.compact_seconds > 0:
+            self._tasks.append(asyncio.ensure_future(self._compact_loop()))
+        logger.info("archiving %d sources to %s", len(self.sources), self.root)
+
+    async def aclose(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush(force=True)
+
+def compact(root: str | Path = ARCHIVE_DIR, min_files: int = ARCHIVE_COMPACT_MIN_FILES,
+            row_group: int = ARCHIVE_ROW_GROUP, today: str | None = None) -> dict[str, int]:
+    """Merge each partition's small Parquet files into one with DuckDB; returns {partition: files merged}.
+
+    Past days are merged whenever they hold two or more files, today's only at
+    min_files. Inputs are deleted after the merged file is in place. A partition
+    that fails (e.g. an unreadable file) is logged and left as is; the rest
+    are still compacted.
+    """
+    import duckdb
+    root, today = Path(root), today or _day(time.time())
+    merged = {}
+    for part in sorted(root.glob("source=*/date=*")):
+        files = sorted(part.glob("*.parquet"))
+        if len(files) < 2 or (part.name == f"date={today}" and len(files) < min_files):
+            continue
+        out = part / f"compacted-{int(time.time())}-{uuid.uuid4().hex[:8]}.parquet"
+        tmp = out.with_suffix(".tmp")
+        con = duckdb.connect()
+        try:
+            con.execute(f"COPY (SELECT * FROM read_parquet(?, union_by_name = true)) TO '{tmp}' "
+                        f"(FORMAT parquet, COMPRESSION zstd, ROW_GROUP_SIZE {int(row_group)})", [[str(f) for f in files]])
+            os.replace(tmp, out)
+        except (duckdb.Error, OSError) as e:
+            ERRORS.labels(part.parent.name.split("=", 1)[1]).inc()
+            logger.warning("compaction of %s failed: %s", part, e)
+            tmp.unlink(missing_ok=True)
+            continue
+        finally:
+            con.close()
+        for f in files:
+            f.unlink()
+        merged[str(part.relative_to(root))] = len(files)
+    return merged
+
+def catalog(root: str | Path, db_path: str):
+    """A DuckDB file with one view per archived source over its Parquet files."""
+    import duckdb
+    root = Path(root)
+    con = duckdb.connect(db_path)
+    try:
+        for src in sorted(root.glob("source=*")):
+            name = src.name.split("=", 1)[1]
+            con.execute(f'CREATE OR REPLACE VIEW "{name}" AS SELECT * FROM read_parquet('
+                        f"'{src.resolve()}/*/*.parquet', hive_partitioning = true, union_by_name = true)")
+    finally:
+        con.close()
+
+archiver = Archiver()
@@ -0,0 +1,246 @@
+import os, sys, time, sqlite3, asyncio, threading, logging
+from collections import OrderedDict
+from urllib.parse import urlparse
+from aiocache import Cache
+from aiocache.base import BaseCache
+from aiocache.serializers import NullSerializer, PickleSerializer
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger("houston")
+
+# Optional cache tier shared by all workers: sqlite:///path.db, redis://host:6379/0, or memory:// (tests)
+CACHE_SHARED_URL = os.environ.get("CACHE_SHARED_URL","")
+CACHE_EVICTION = os.environ.get("CACHE_EVICTION","lru").lower()
+# LFU evicts the least-used of this many least-recently-used entries
+LFU_SAMPLE = 16
+
+HITS = Counter("cache_backend_hits_total", "Cache backend hits", ["cache"])
+MISSES = Counter("cache_backend_misses_total", "Cache backend misses", ["cache"])
+EVICTIONS = Counter("cache_backend_evictions_total", "Cache backend evictions", ["cache","reason"])
+BYTES = Gauge("cache_backend_bytes", "Approximate payload bytes held", ["cache"])
+ENTRIES = Gauge("cache_backend_entries", "Entries held", ["cache"])
+
+def approx_size(value) -> int:
+    size = getattr(value, "size", None)
+    if size is not None:
+        return size
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    return sys.getsizeof(value)
+
+class BoundedMemoryCache(BaseCache):
+    """In-process aiocache backend bounded by entry count and approximate bytes.
+
+    Values are sized with approx_size() (entries built from upstream responses
+    carry their body length). Expiry is checked lazily on read instead of with
+    one timer per key; capacity evictions are LRU, or sampled LFU.
+    """
+
+    NAME = "bounded_memory"
+
+    def __init__(self, max_entries: int | None = None, max_bytes: int | None = None,
+                 eviction: str = CACHE_EVICTION, name: str = "default", **kwargs):
+        kwargs.setdefault("timeout", None)
+        super().__init__(serializer=NullSerializer(), **kwargs)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self.name = name
+        self.bytes = 0
+        self._data: OrderedDict[str, tuple] = OrderedDict()  # key -> (value, expires_at, size)
+        self._uses: dict[str, int] = {}
+
+    def __len__(self):
+        return len(self._data)
+
+    def _gauges(self):
+        BYTES.labels(self.name).set(self.bytes)
+        ENTRIES.labels(self.name).set(len(self._data))
+
+    def _pop(self, key, reason=None):
+        item = self._data.pop(key, None)
+        if item is None:
+            return 0
+        self._uses.pop(key, None)
+        self.bytes -= item[2]
+        if reason:
+            EVICTIONS.labels(self.name, reason).inc()
+        return 1
+
+    def _victim(self, keep):
+        if self.eviction != "lfu":
+            return next(iter(self._data))
+        oldest = []
+        for key in self._data:
+            if key == keep:
+                continue
+            oldest.append(key)
+            if len(oldest) == LFU_SAMPLE:
+                break
+        return min(oldest, key=lambda k: self._uses.get(k, 0))
+
+    def _lookup(self, key):
+        item = self._data.get(key)
+        if item is not None and item[1] is not None and item[1] <= time.monotonic():
+            self._pop(key, "expired")
+            self._gauges()
+            item = None
+        if item is None:
+            MISSES.labels(self.name).inc()
+            return None
+        HITS.labels(self.name).inc()
+        self._data.move_to_end(key)
+        self._uses[key] = self._uses.get(key, 0) + 1
+        return item[0]
+
+    async def _get(self, key, encoding="utf-8", _conn=None):
+        return self._lookup(key)
+
+    async def _gets(self, key, encoding="utf-8", _conn=None):
+        return self._lookup(key)
+
+    async def _multi_get(self, keys, encoding="utf-8", _conn=None):
+        return [self._lookup(k) for k in keys]
+
+    async def _set(self, key, value, ttl=None, _cas_token=None, _conn=None):
+        if _cas_token is not None and _cas_token != self._lookup(key):
+            return 0
+        size = approx_size(value)
+        self._pop(key)
+        if self.max_bytes and size > self.max_bytes:
+            EVICTIONS.labels(self.name, "oversize").inc()
+            self._gauges()
+            return False
+        self._data[key] = (value, time.monotonic() + ttl if ttl else None, size)
+        self._uses[key] = 1
+        self.bytes += size
+        while len(self._data) > 1 and ((self.max_entries and len(self._data) > self.max_entries)
+                                       or (self.max_bytes and self.bytes > self.max_bytes)):
+            self._pop(self._victim(key), "capacity")
+        self._gauges()
+        return True
+
+    async def _multi_set(self, pairs, ttl=None, _conn=None):
+        for key, value in pairs:
+            await self._set(key, value, ttl=ttl)
+        return True
+
+    async def _add(self, key, value, ttl=None, _conn=None):
+        if key in self._data:
+            raise ValueError("Key {} already exists, use .set to update the value".format(key))
+        return await self._set(key, value, ttl=ttl)
+
+    async def _exists(self, key, _conn=None):
+        item = self._data.get(key)
+        return item is not None and (item[1] is None or item[1] > time.monotonic())
+
+    async def _expire(self, key, ttl, _conn=None):
+        item = self._data.get(key)
+        if item is None:
+            return False
+        self._data[key] = (item[0], time.monotonic() + ttl if ttl else None, item[2])
+        return True
+
+    async def _delete(self, key, _conn=None):
+        n = self._pop(key)
+        self._gauges()
+        return n
+
+    async def _clear(self, namespace=None, _conn=None):
+        for key in [k for k in self._data if not namespace or k.startswith(namespace)]:
+            self._pop(key)
+        self._gauges()
+        return True
+
+class SqliteCache(BaseCache):
+    """aiocache backend on a local SQLite file, shared by every worker on the node.
+
+    WAL mode lets readers proceed while one worker writes; queries run in a
+    thread so the event loop never blocks on file locks. Expired rows are
+    ignored on read and purged on write.
+    """
+
+    NAME = "sqlite"
+
+    def __init__(self, path: str, **kwargs):
+        kwargs.setdefault("serializer", PickleSerializer())
+        kwargs.setdefault("timeout", None)
+        super().__init__(**kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)")
+        self._writes = 0
+
+    async def _run(self, sql, args=()):
+        def run():
+            with self._lock:
+                return self._db.execute(sql, args).fetchall()
+        return await asyncio.to_thread(run)
+
+    async def _get(self, key, encoding="utf-8", _conn=None):
+        rows = await self._run("SELECT value FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                               (key, time.time()))
+        return rows[0][0] if rows else None
+
+    async def _gets(self, key, encoding="utf-8", _conn=None):
+        return await self._get(key, encoding)
+
+    async def _multi_get(self, keys, encoding="utf-8", _conn=None):
+        return [await self._get(k, encoding) for k in keys]
+
+    async def _set(self, key, value, ttl=None, _cas_token=None, _conn=None):
+        await self._run("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                        (key, value, time.time() + ttl if ttl else None))
+        self._writes += 1
+        if self._writes % 500 == 0:
+            await self._run("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        return True
+
+    async def _multi_set(self, pairs, ttl=None, _conn=None):
+        for key, value in pairs:
+            await self._set(key, value, ttl=ttl)
+        return True
+
+    async def _add(self, key, value, ttl=None, _conn=None):
+        if await self._exists(key):
+            raise ValueError("Key {} already exists, use .set to update the value".format(key))
+        return await self._set(key, value, ttl=ttl)
+
+    async def _exists(self, key, _conn=None):
+        return await self._get(key) is not None
+
+    async def _expire(self, key, ttl, _conn=None):
+        await self._run("UPDATE cache SET expires_at = ? WHERE key = ?", (time.time() + ttl if ttl else None, key))
+        return True
+
+    async def _delete(self, key, _conn=None):
+        await self._run("DELETE FROM cache WHERE key = ?", (key,))
+        return 1
+
+    async def _clear(self, namespace=None, _conn=None):
+        if namespace:
+            await self._run("DELETE FROM cache WHERE key LIKE ?", (namespace + "%",))
+        else:
+            await self._run("DELETE FROM cache")
+        return True
+
+    async def _close(self, *args, _conn=None, **kwargs):
+        self._db.close()
+
+def shared_backend(url: str = CACHE_SHARED_URL):
+    """Build the cross-worker cache tier named by CACHE_SHARED_URL, or None."""
+    if not url:
+        return None
+    parsed = urlparse(url)
+    try:
+        if parsed.scheme == "sqlite":
+            return SqliteCache(parsed.path)
+        cache = Cache.from_url(url)  # redis:// needs the redis package
+        cache.serializer = PickleSerializer()
+        return cache
+    except Exception as e:
+        logger.warning("shared cache %s unavailable, using per-worker cache only: %s", url, e)
+        return None
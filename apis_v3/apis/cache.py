@@ -0,0 +1,170 @@
+import time, logging, asyncio, hashlib
+from dataclasses import dataclass, field
+from typing import Any
+from prometheus_client import Counter
+from apis.backends import BoundedMemoryCache, shared_backend
+from apis.policies import CachePolicy, policy_for, CACHE_TTL, CACHE_MAX_STALE, CACHE_STALE_IF_ERROR
+
+logger = logging.getLogger("houston")
+
+FLIGHTS = Counter("upstream_singleflight_total", "Upstream fetch requests by single-flight outcome", ["outcome"])
+LOOKUPS = Counter("response_cache_lookups_total", "Response cache lookups by result", ["policy","result"])
+SHARED = Counter("response_cache_shared_total", "Shared (L2) cache tier lookups by result", ["policy","result"])
+
+# Single-flight: concurrent misses for the same key share one upstream fetch
+_inflight: dict[str, asyncio.Future] = {}
+
+def _forget(key: str, fut: asyncio.Future):
+    if _inflight.get(key) is fut:
+        del _inflight[key]
+    if not fut.cancelled():
+        fut.exception()  # mark retrieved; waiters already got it
+
+async def single_flight(key: str, fetch):
+    fut = _inflight.get(key)
+    if fut is None:
+        FLIGHTS.labels("fetch").inc()
+        fut = _inflight[key] = asyncio.ensure_future(fetch())
+        fut.add_done_callback(lambda f: _forget(key, f))
+    else:
+        FLIGHTS.labels("coalesced").inc()
+    return await asyncio.shield(fut)
+
+@dataclass
+class Entry:
+    value: Any
+    size: int | None = None  # upstream body length, used for byte-bounded backends
+    stored_at: float = field(default_factory=time.time)
+    etag: str | None = None
+    last_modified: str | None = None
+
+    def age(self, now: float | None = None) -> float:
+        return (time.time() if now is None else now) - self.stored_at
+
+class ResponseCache:
+    """TTL cache with stale-while-revalidate and stale-if-error.
+
+    - age < ttl: served as-is.
+    - ttl <= age < ttl + max_stale: served immediately, refreshed in the background.
+    - otherwise fetched inline; if that fails and age < ttl + stale_if_error the
+      old value is served instead of the error.
+
+    A caller that polls (max_age) treats entries older than that as expired:
+    they are refetched inline, never served stale while revalidating.
+
+    fetch(previous) receives the entry being replaced (or None) so it can
+    revalidate with the upstream's validators and return it re-stamped.
+
+    Lookups go to the in-process backend (L1) first, then to the optional
+    shared tier (L2) used by all workers; L2 hits are copied into L1.
+    """
+
+    def __init__(self, backend=None, ttl: float = CACHE_TTL, max_stale: float = CACHE_MAX_STALE,
+                 stale_if_error: float = CACHE_STALE_IF_ERROR, name: str = "default", shared=None):
+        self.backend = backend or BoundedMemoryCache(name=name)
+        self.shared = shared
+        self.name = name
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.stale_if_error = stale_if_error
+        self._refreshing: set[asyncio.Task] = set()
+
+    @property
+    def retention(self) -> float:
+        return self.ttl + max(self.max_stale, self.stale_if_error)
+
+    def _shared_key(self, key: str) -> str:
+        return f"houston:{self.name}:{hashlib.sha1(key.encode()).hexdigest()}"
+
+    async def _lookup(self, key: str):
+        local = await self.backend.get(key)
+        if self.shared is None or (local is not None and local.age() < self.ttl):
+            return local
+        # L1 missed or is stale: another worker may already have refreshed it
+        try:
+            entry = await self.shared.get(self._shared_key(key))
+        except Exception as e:
+            SHARED.labels(self.name, "error").inc()
+            logger.warning("shared cache read failed for %s: %s", key, e)
+            return local
+        SHARED.labels(self.name, "miss" if entry is None else "hit").inc()
+        if entry is None or (local is not None and local.stored_at >= entry.stored_at):
+            return local
+        if self.retention - entry.age() > 0:
+            await self.backend.set(key, entry, ttl=self.retention - entry.age())
+        return entry
+
+    async def _store(self, key: str, fetch, previous: Entry | None):
+        entry = await fetch(previous)
+        if not isinstance(entry, Entry):
+            entry = Entry(entry)
+        await self.backend.set(key, entry, ttl=self.retention)
+        if self.shared is not None:
+            try:
+                await self.shared.set(self._shared_key(key), entry, ttl=self.retention)
+            except Exception as e:
+                SHARED.labels(self.name, "error").inc()
+                logger.warning("shared cache write failed for %s: %s", key, e)
+        return entry.value
+
+    def _revalidate(self, key: str, fetch, previous: Entry):
+        async def refresh():
+            try:
+                await single_flight(key, lambda: self._store(key, fetch, previous))
+            except Exception as e:
+                logger.warning("background refresh failed for %s: %s", key, e)
+        task = asyncio.ensure_future(refresh())
+        self._refreshing.add(task)
+        task.add_done_callback(self._refreshing.discard)
+
+    async def get_or_fetch(self, key: str, fetch, max_age: float | None = None):
+        entry = await self._lookup(key)
+        age = entry.age() if entry else None
+        if entry and age < (self.ttl if max_age is None else min(self.ttl, max_age)):
+            LOOKUPS.labels(self.name, "fresh").inc()
+            return entry.value
+        if entry and max_age is None and age < self.ttl + self.max_stale:
+            LOOKUPS.labels(self.name, "stale").inc()
+            self._revalidate(key, fetch, entry)
+            return entry.value
+        LOOKUPS.labels(self.name, "miss").inc()
+        try:
+            return await single_flight(key, lambda: self._store(key, fetch, entry))
+        except Exception as e:
+            if entry and age < self.ttl + self.stale_if_error:
+                LOOKUPS.labels(self.name, "stale_if_error").inc()
+                logger.warning("serving stale %s after upstream error: %s", key, e)
+                return entry.value
+            raise
+
+    async def aclose(self):
+        for task in list(self._refreshing):
+            task.cancel()
+        await asyncio.gather(*self._refreshing, return_exceptions=True)
+
+    @classmethod
+    def from_policy(cls, policy: CachePolicy):
+        return cls(_backend_for(policy), ttl=policy.ttl, max_stale=policy.max_stale,
+                   stale_if_error=policy.stale_if_error, name=policy.name, shared=shared)
+
+def _backend_for(policy: CachePolicy):
+    return BoundedMemoryCache(max_entries=policy.max_entries, max_bytes=policy.max_bytes, name=policy.name)
+
+# Cross-worker L2 tier, shared by all partitions (keys are prefixed with the policy name)
+shared = shared_backend()
+
+# One cache partition per policy, so each can be sized and expired independently
+caches: dict[str, ResponseCache] = {}
+
+def cache_for(url: str, policy: str | None = None) -> ResponseCache:
+    p = policy_for(url, policy)
+    cache = caches.get(p.name)
+    if cache is None:
+        cache = caches[p.name] = ResponseCache.from_policy(p)
+    return cache
+
+async def aclose():
+    for cache in caches.values():
+        await cache.aclose()
+    if shared is not None:
+        await shared.close()
@@ -0,0 +1,262 @@
+import os, time, zlib, asyncio, logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+from prometheus_client import Counter, Gauge, Histogram
+from apis import archive, loader
+
+logger = logging.getLogger("houston")
+
+# Kafka cluster the MQTT bridge produces to (same variable as the bridge); consuming needs the aiokafka package
+KAFKA_BROKERS = os.environ.get("KAFKA_BROKERS","localhost:9092")
+KAFKA_TOPIC = os.environ.get("KAFKA_TOPIC","air-quality-data")
+KAFKA_GROUP_ID = os.environ.get("KAFKA_GROUP_ID","houston-apis")
+# A micro-batch is flushed once it has this many messages, or this many seconds after it started
+CONSUMER_BATCH_MAX = int(os.environ.get("CONSUMER_BATCH_MAX","5000"))
+CONSUMER_BATCH_SECONDS = float(os.environ.get("CONSUMER_BATCH_SECONDS","5"))
+# (device_id, timestamp) keys remembered across batches, so redelivered readings aren't archived twice
+CONSUMER_DEDUP_KEYS = int(os.environ.get("CONSUMER_DEDUP_KEYS","100000"))
+ARCHIVE_SOURCE = "air_quality"
+
+LAG = Gauge("consumer_lag_messages", "Messages between the consumer position and the end of each partition",
+            ["topic","partition"])
+BATCH_SIZE = Histogram("consumer_batch_messages", "Messages per consumer micro-batch",
+                       buckets=(1, 10, 50, 100, 500, 1000, 5000, 10000))
+FLUSH_SECONDS = Histogram("consumer_flush_seconds", "Time to decode, validate and write one micro-batch",
+                          buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+MESSAGES = Counter("consumer_messages_total", "Consumed messages by outcome", ["outcome"])
+
+@dataclass(frozen=True)
+class Message:
+    partition: int
+    offset: int
+    key: bytes | None
+    value: bytes
+
+class InMemoryBroker:
+    """Stand-in for one Kafka topic and consumer group, for tests and offline runs.
+
+    produce() appends to a partition log (chosen by key, like Kafka's default
+    partitioner); poll() reads from the group's position and commit() stores the
+    next offset to read.
+    """
+
+    def __init__(self, topic: str = KAFKA_TOPIC, partitions: int = 1):
+        self.topic = topic
+        self.logs: list[list[Message]] = [[] for _ in range(partitions)]
+        self.positions = [0] * partitions
+        self.committed = [0] * partitions
+
+    def produce(self, value, key: str | None = None):
+        p = zlib.crc32(key.encode()) % len(self.logs) if key else 0
+        log = self.logs[p]
+        log.append(Message(p, len(log), key.encode() if key else None,
+                           value if isinstance(value, bytes) else orjson.dumps(value)))
+
+    async def poll(self, max_records: int, timeout: float) -> list[Message]:
+        out = []
+        for p, log in enumerate(self.logs):
+            take = log[self.positions[p]:self.positions[p] + max_records - len(out)]
+            self.positions[p] += len(take)
+            out += take
+        if not out:
+            await asyncio.sleep(min(timeout, 0.05))
+        return out
+
+    async def commit(self, offsets: dict[int, int]):
+        for p, offset in offsets.items():
+            self.committed[p] = max(self.committed[p], offset)
+
+    async def lag(self) -> dict[int, int]:
+        return {p: len(log) - self.positions[p] for p, log in enumerate(self.logs)}
+
+    async def close(self):
+        pass
+
+class KafkaBroker:
+    """The topic through aiokafka, with auto-commit off: offsets are committed only after a batch is written."""
+
+    def __init__(self, brokers: str = KAFKA_BROKERS, topic: str = KAFKA_TOPIC, group_id: str = KAFKA_GROUP_ID):
+        from aiokafka import AIOKafkaConsumer  # optional: only needed against a real cluster
+        self.topic = topic
+        self.consumer = AIOKafkaConsumer(topic, bootstrap_servers=brokers, group_id=group_id,
+                                         enable_auto_commit=False, auto_offset_reset="earliest")
+
+    async def start(self):
+        await self.consumer.start()
+
+    async def poll(self, max_records: int, timeout: float) -> list[Message]:
+        data = await self.consumer.getmany(timeout_ms=int(timeout * 1000), max_records=max_records)
+        return [Message(r.partition, r.offset, r.key, r.value) for records in data.values() for r in records]
+
+    async def commit(self, offsets: dict[int, int]):
+        from aiokafka import TopicPartition
+        await self.consumer.commit({TopicPartition(self.topic, p): o for p, o in offsets.items()})
+
+    async def lag(self) -> dict[int, int]:
+        out = {}
+        for tp in self.consumer.assignment():
+            end = self.consumer.highwater(tp)
+            if end is not None:
+                out[tp.partition] = end - await self.consumer.position(tp)
+        return out
+
+    async def close(self):
+        await self.consumer.stop()
+
+def _table(records: list[dict]) -> pa.Table:
+    """Readings as an INPUT_TYPES table; records whose fields don't fit the types are dropped one by one."""
+    schema = pa.schema(loader.INPUT_TYPES)
+    try:
+        return pa.Table.from_pylist(records, schema=schema)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        good = []
+        for r in records:
+            try:
+                good.append(pa.Table.from_pylist([r], schema=schema))
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                MESSAGES.labels("undecodable").inc()
+        return pa.concat_tables(good) if good else schema.empty_table()
+
+def _batch_name(messages: list[Message]) -> str:
+    """File name for a batch from its offset ranges, e.g. kafka-0.120-239_1.80-161: the same batch, the same name."""
+    ranges = {}
+    for m in messages:
+        lo, hi = ranges.get(m.partition, (m.offset, m.offset))
+        ranges[m.partition] = (min(lo, m.offset), max(hi, m.offset))
+    return "kafka-" + "_".join(f"{p}.{lo}-{hi}" for p, (lo, hi) in sorted(ranges.items()))
+
+class Consumer:
+    """Reads air-quality-data in micro-batches and writes each one in bulk.
+
+    A batch closes at max_records messages or max_seconds after it started.
+    Readings are deduplicated on (device_id, timestamp) within the batch and
+    against the last dedup_keys written, validated like the bulk loader, merged
+    into the store (if any) and appended as one Parquet file to the archive's
+    source=air_quality partition, where the rollups pick them up. Offsets are
+    committed only after both writes, and a failed batch is retried as is: the
+    store merge skips readings it already has, and the archive file is named
+    after the batch's offsets, so a retry that finds it doesn't write it again.
+    A batch redelivered after a restart may be cut differently and land in a
+    second file; the air_quality rollups count each (device, time) once.
+    """
+
+    def __init__(self, broker, store=None, archive_root: str | Path | None = archive.ARCHIVE_DIR,
+                 max_records: int = CONSUMER_BATCH_MAX, max_seconds: float = CONSUMER_BATCH_SECONDS,
+                 dedup_keys: int = CONSUMER_DEDUP_KEYS):
+        self.broker = broker
+        self.store = store
+        self.archive_root = Path(archive_root) if archive_root else None
+        self.max_records = max_records
+        self.max_seconds = max_seconds
+        self.dedup_keys = dedup_keys
+        self._recent: OrderedDict[tuple, None] = OrderedDict()
+        self._pending: list[Message] = []
+        self._task: asyncio.Task | None = None
+
+    async def batch(self) -> list[Message]:
+        messages, deadline = [], time.monotonic() + self.max_seconds
+        while len(messages) < self.max_records and (left := deadline - time.monotonic()) > 0:
+            messages += await self.broker.poll(self.max_records - len(messages), left)
+        topic = getattr(self.broker, "topic", KAFKA_TOPIC)
+        for p, n in (await self.broker.lag()).items():
+            LAG.labels(topic, str(p)).set(n)
+        return messages
+
+    def _decode(self, messages: list[Message]) -> dict[tuple, dict]:
+        out = {}
+        for m in messages:
+            try:
+                r = orjson.loads(m.value)
+            except orjson.JSONDecodeError:
+                r = None
+            if not isinstance(r, dict):
+                MESSAGES.labels("undecodable").inc()
+                continue
+            # the bridge's CSV writer falls back to arrival time the same way
+            r["timestamp"] = r.get("timestamp") or r.get("ingestion_timestamp")
+            key = (r.get("device_id"), r["timestamp"])
+            if key in out or key in self._recent:
+                MESSAGES.labels("duplicate").inc()
+                continue
+            out[key] = r
+        return out
+
+    async def flush(self, messages: list[Message]) -> dict:
+        """Write one batch and commit its offsets; returns {"messages", "written", "merged", "rejected"}."""
+        started = time.perf_counter()
+        records = self._decode(messages)
+        decoded = _table(list(records.values()))
+        table, rejected = loader.prepare(decoded)
+        merged = 0
+        if table.num_rows:
+            if self.store is not None:
+                merged = await asyncio.to_thread(self.store.write, table)
+                loader.MERGED.inc(merged)
+            if self.archive_root is not None:
+                await asyncio.to_thread(self._archive, table, _batch_name(messages))
+        if messages:
+            offsets = {}
+            for m in messages:
+                offsets[m.partition] = max(offsets.get(m.partition, 0), m.offset + 1)
+            await self.broker.commit(offsets)
+        for key in records:
+            self._recent[key] = None
+        while len(self._recent) > self.dedup_keys:
+            self._recent.popitem(last=False)
+        MESSAGES.labels("written").inc(table.num_rows)
+        MESSAGES.labels("rejected").inc(decoded.num_rows - table.num_rows)
+        BATCH_SIZE.observe(len(messages))
+        FLUSH_SECONDS.observe(time.perf_counter() - started)
+        return {"messages": len(messages), "written": table.num_rows, "merged": merged, "rejected": rejected}
+
+    def _archive(self, table: pa.Table, name: str):
+        """Write the batch as <name>.parquet, unless a retry of the same batch already did."""
+        source = self.archive_root / f"source={ARCHIVE_SOURCE}"
+        if any(source.glob(f"date=*/{name}.parquet")):
+            return
+        now = time.time()
+        # the columns as the bridge sends them, so archived readings look the same however they arrived
+        ts = pc.cast(pc.cast(table["time"], pa.timestamp("ms")), pa.int64())
+        table = table.set_column(0, "timestamp", ts)
+        table = table.append_column("fetched_at", pa.array([int(now)] * table.num_rows, pa.int64()))
+        path = source / f"date={archive._day(now)}" / f"{name}.parquet"
+        archive.FILES.labels(ARCHIVE_SOURCE).inc(archive._write(path, [table], archive.ARCHIVE_ROW_GROUP))
+
+    async def run_once(self) -> dict | None:
+        """Read (or retry) one batch and flush it; None when the topic had nothing new."""
+        if not self._pending:
+            self._pending = await self.batch()
+            if not self._pending:
+                return None
+        out = await self.flush(self._pending)
+        self._pending = []
+        return out
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            try:
+                await self.run_once()
+                backoff = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                MESSAGES.labels("failed").inc(len(self._pending))
+                logger.warning("consumer flush failed, retrying in %.0fs: %s", backoff, e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.broker.close()
@@ -0,0 +1,70 @@
+import heapq, math
+
+KM_PER_DEG = 111.32
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Equirectangular approximation; well under 0.1% error at city scale."""
+    x = (lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    return KM_PER_DEG * math.hypot(x, lat2 - lat1)
+
+class GridIndex:
+    """Uniform lat/lon grid over a set of points for bbox and nearest-N queries.
+
+    Points are bucketed once into cell_deg x cell_deg cells; a query only
+    looks at the cells it overlaps (bbox) or rings of cells outward from the
+    query point until no closer point can remain (nearest). Rows with a
+    missing coordinate are left out.
+    """
+
+    def __init__(self, lats, lons, cell_deg: float = 0.05):
+        self.lats, self.lons = lats, lons
+        self.cell = cell_deg
+        self.cells: dict[tuple[int, int], list[int]] = {}
+        for i, (lat, lon) in enumerate(zip(lats, lons)):
+            if lat is not None and lon is not None:
+                self.cells.setdefault(self._key(lat, lon), []).append(i)
+        keys = self.cells.keys()
+        self.bounds = (min(k[0] for k in keys), min(k[1] for k in keys),
+                       max(k[0] for k in keys), max(k[1] for k in keys)) if keys else None
+
+    def __len__(self):
+        return sum(len(v) for v in self.cells.values())
+
+    def _key(self, lat, lon):
+        return math.floor(lat / self.cell), math.floor(lon / self.cell)
+
+    def within(self, minlat: float, minlon: float, maxlat: float, maxlon: float) -> list[int]:
+        """Row indices inside the box, in original order."""
+        (r0, c0), (r1, c1) = self._key(minlat, minlon), self._key(maxlat, maxlon)
+        lats, lons, out = self.lats, self.lons, []
+        for r in range(r0, r1 + 1):
+            for c in range(c0, c1 + 1):
+                for i in self.cells.get((r, c), ()):
+                    if minlat <= lats[i] <= maxlat and minlon <= lons[i] <= maxlon:
+                        out.append(i)
+        out.sort()
+        return out
+
+    def nearest(self, lat: float, lon: float, n: int) -> list[tuple[float, int]]:
+        """Up to n (distance_km, row index) pairs, closest first."""
+        if self.bounds is None or n <= 0:
+            return []
+        qr, qc = self._key(lat, lon)
+        br0, bc0, br1, bc1 = self.bounds
+        last = max(abs(qr - br0), abs(qr - br1), abs(qc - bc0), abs(qc - bc1))
+        # a point k rings away is at least (k - 1) cells away on the shorter (longitude) axis
+        ring_km = KM_PER_DEG * self.cell * min(1.0, math.cos(math.radians(min(abs(lat) + self.cell * (last + 1), 89))))
+        best: list[tuple[float, int]] = []  # max-heap of the n closest so far, as (-distance, index)
+        for k in range(last + 1):
+            if len(best) == n and -best[0][0] <= (k - 1) * ring_km:
+                break
+            for r in range(qr - k, qr + k + 1):
+                cols = range(qc - k, qc + k + 1) if r in (qr - k, qr + k) else (qc - k, qc + k)
+                for c in cols:
+                    for i in self.cells.get((r, c), ()):
+                        d = distance_km(lat, lon, self.lats[i], self.lons[i])
+                        if len(best) < n:
+                            heapq.heappush(best, (-d, i))
+                        elif d < -best[0][0]:
+                            heapq.heapreplace(best, (-d, i))
+        return sorted((-d, i) for d, i in best)
@@ -0,0 +1,172 @@
+import os, io, time, asyncio, logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+import duckdb
+import orjson
+import pyarrow as pa
+from apis import archive
+
+logger = logging.getLogger("houston")
+
+# Hard caps for /history/* queries
+HISTORY_MAX_ROWS = int(os.environ.get("HISTORY_MAX_ROWS","100000"))
+HISTORY_MAX_DAYS = int(os.environ.get("HISTORY_MAX_DAYS","90"))
+BATCH_ROWS = 8192
+BUCKETS = ("minute", "hour", "day", "week", "month")
+FORMATS = {"ndjson": "application/x-ndjson", "arrow": "application/vnd.apache.arrow.stream"}
+
+# One in-memory database; every query runs on its own cursor in a worker thread
+_db = duckdb.connect()
+
+@dataclass
+class Result:
+    body: object  # async iterator of bytes
+    media_type: str
+
+def _root() -> Path:
+    return Path(archive.ARCHIVE_DIR)
+
+def sources() -> list[dict]:
+    out = []
+    for src in sorted(_root().glob("source=*")):
+        days = sorted(p.name.split("=", 1)[1] for p in src.glob("date=*"))
+        out.append({"source": src.name.split("=", 1)[1], "first_day": days[0] if days else None,
+                    "last_day": days[-1] if days else None, "days": len(days)})
+    return out
+
+def scan(source: str) -> str | None:
+    """read_parquet() over one archived source, or None if it has no files.
+
+    Blocking (filesystem checks); call it in a worker thread. Only names that
+    are an existing source=<name> directory directly under the archive root are
+    accepted, so user input never reaches the SQL text; `date` is a typed Hive
+    partition column so date filters prune whole directories before any file is opened.
+    """
+    root = _root().resolve()
+    path = (root / f"source={source}").resolve()
+    if path.parent != root or not path.is_dir() or not any(path.glob("*/*.parquet")):
+        return None
+    glob = str(path / "*" / "*.parquet").replace("'", "''")
+    return f"read_parquet('{glob}', hive_partitioning = true, hive_types = {{'date': DATE}}, union_by_name = true)"
+
+def _window(days: float) -> tuple:
+    """(first partition day, first fetched_at) for the last `days` days, capped at HISTORY_MAX_DAYS."""
+    since = time.time() - max(0.0, min(days, HISTORY_MAX_DAYS)) * 86400
+    return datetime.fromtimestamp(since, timezone.utc).date(), int(since)
+
+def _ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def _columns(src: str) -> list[str]:
+    return [r[0] for r in _db.cursor().execute(f"DESCRIBE SELECT * FROM {src}").fetchall()]
+
+async def _batches(reader):
+    def next_batch():
+        try:
+            return reader.read_next_batch()
+        except StopIteration:  # can't cross to_thread: asyncio futures reject StopIteration
+            return None
+
+    while (batch := await asyncio.to_thread(next_batch)) is not None:
+        yield batch
+
+async def _ndjson(reader):
+    """One JSON object per row; a failure mid-stream (e.g. files compacted away) ends with an {"error": ...} line."""
+    try:
+        async for batch in _batches(reader):
+            yield b"".join(orjson.dumps(row) + b"\n" for row in batch.to_pylist())
+    except (duckdb.Error, pa.ArrowException, OSError) as e:
+        logger.warning("history stream failed: %s", e)
+        yield orjson.dumps({"error": f"Query failed: {e}"}) + b"\n"
+
+async def _arrow(reader):
+    """Arrow IPC stream, flushed after every record batch; a failure mid-stream ends the stream early."""
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, reader.schema)
+
+    def drain():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    try:
+        async for batch in _batches(reader):
+            writer.write_batch(batch)
+            yield drain()
+    except (duckdb.Error, pa.ArrowException, OSError) as e:
+        logger.warning("history stream failed: %s", e)
+    writer.close()
+    yield drain()
+
+async def run(sql: str, params: list, fmt: str = "ndjson", limit: int = HISTORY_MAX_ROWS, con=None):
+    """Execute a parameterized query (capped at HISTORY_MAX_ROWS) and stream its result batch by batch.
+
+    con: the DuckDB connection to query (default: the in-memory one reading the archive).
+    """
+    if fmt not in FORMATS:
+        return {"error": f"format must be one of {','.join(FORMATS)}"}
+    limit = max(1, min(int(limit), HISTORY_MAX_ROWS))
+
+    def execute():
+        return (con or _db).cursor().execute(f"{sql} LIMIT {limit}", params).to_arrow_reader(BATCH_ROWS)
+
+    try:
+        reader = await asyncio.to_thread(execute)
+    except duckdb.Error as e:
+        logger.warning("history query failed: %s", e)
+        return {"error": f"Query failed: {e}"}
+    return Result(_ndjson(reader) if fmt == "ndjson" else _arrow(reader), FORMATS[fmt])
+
+async def rows(source: str, days: float = 1, columns: str | None = None, fmt: str = "ndjson",
+               limit: int = HISTORY_MAX_ROWS):
+    src = await asyncio.to_thread(scan, source)
+    if src is None:
+        return {"error": f"No archive for {source}"}
+    select = "*"
+    if columns:
+        known = await asyncio.to_thread(_columns, src)
+        names = [c.strip() for c in columns.split(",") if c.strip()]
+        if unknown := [c for c in names if c not in known]:
+            return {"error": f"unknown columns: {','.join(unknown)}"}
+        select = ", ".join(_ident(c) for c in names)
+    day, since = _window(days)
+    return await run(f"SELECT {select} FROM {src} WHERE date >= ? AND fetched_at >= ? ORDER BY fetched_at",
+                     [day, since], fmt, limit)
+
+async def counts(source: str, group_by: str | None = None, bucket: str = "week", distinct: str | None = None,
+                 days: float = 30, fmt: str = "ndjson", limit: int = HISTORY_MAX_ROWS):
+    """Rows (or distinct values of `distinct`) per time bucket and optional group column."""
+    src = await asyncio.to_thread(scan, source)
+    if src is None:
+        return {"error": f"No archive for {source}"}
+    if bucket not in BUCKETS:
+        return {"error": f"bucket must be one of {','.join(BUCKETS)}"}
+    known = await asyncio.to_thread(_columns, src)
+    if unknown := [c for c in (group_by, distinct) if c and c not in known]:
+        return {"error": f"unknown columns: {','.join(unknown)}"}
+    group = f", {_ident(group_by)} AS {_ident(group_by)}" if group_by else ""
+    n = f"count(DISTINCT {_ident(distinct)})" if distinct else "count(*)"
+    day, since = _window(days)
+    return await run(f"SELECT date_trunc(?, to_timestamp(fetched_at)) AS bucket{group}, {n} AS n FROM {src} "
+                     f"WHERE date >= ? AND fetched_at >= ? GROUP BY ALL ORDER BY ALL", [bucket, day, since], fmt, limit)
+
+async def purpleair_pm25(days: float = 30, bucket: str = "hour", q: float = 0.5, sensor_index: int | None = None,
+                         fmt: str = "ndjson", limit: int = HISTORY_MAX_ROWS):
+    """PM2.5 percentile q per sensor per time bucket from the archived PurpleAir region snapshots."""
+    src = await asyncio.to_thread(scan, "purpleair.region")
+    if src is None:
+        return {"error": "No archive for purpleair.region"}
+    if bucket not in BUCKETS:
+        return {"error": f"bucket must be one of {','.join(BUCKETS)}"}
+    if not 0 <= q <= 1:
+        return {"error": "q must be between 0 and 1"}
+    day, since = _window(days)
+    where, params = "date >= ? AND fetched_at >= ?", [day, since]
+    if sensor_index is not None:
+        where += " AND sensor_index = ?"
+        params.append(sensor_index)
+    return await run(f'SELECT sensor_index, date_trunc(?, to_timestamp(fetched_at)) AS bucket, '
+                     f'quantile_cont("pm2.5_atm", ?) AS pm25, count("pm2.5_atm") AS n FROM {src} '
+                     f'WHERE {where} GROUP BY ALL ORDER BY ALL', [bucket, q, *params], fmt, limit)
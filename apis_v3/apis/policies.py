@@ -0,0 +1,78 @@
+import os, json, logging
+from dataclasses import dataclass, replace
+from fnmatch import fnmatchcase
+
+logger = logging.getLogger("houston")
+
+CACHE_TTL = int(os.environ.get("CACHE_TTL","60"))
+# Serve an expired entry for up to this long while it is refreshed in the background
+CACHE_MAX_STALE = int(os.environ.get("CACHE_MAX_STALE","300"))
+# Serve an expired entry for up to this long when the upstream refresh fails
+CACHE_STALE_IF_ERROR = int(os.environ.get("CACHE_STALE_IF_ERROR","3600"))
+
+HOUR = 3600
+DAY = 24 * HOUR
+MB = 1024 * 1024
+
+@dataclass(frozen=True)
+class CachePolicy:
+    name: str
+    patterns: tuple[str, ...] = ()
+    ttl: float = CACHE_TTL
+    max_stale: float = CACHE_MAX_STALE
+    stale_if_error: float = CACHE_STALE_IF_ERROR
+    max_entries: int | None = None
+    max_bytes: int | None = None
+
+    def matches(self, url: str) -> bool:
+        return any(fnmatchcase(url, p) for p in self.patterns)
+
+DEFAULT = CachePolicy("default", max_entries=2000, max_bytes=64 * MB)
+
+# First match wins. Sources whose URLs come from env (GTFS-rt) pass the policy name explicitly.
+POLICIES = [
+    CachePolicy("nws.points", ("https://api.weather.gov/points/*",),
+                ttl=6 * HOUR, max_stale=DAY, stale_if_error=7 * DAY, max_entries=5000, max_bytes=16 * MB),
+    CachePolicy("nws.forecast", ("https://api.weather.gov/gridpoints/*",),
+                ttl=15 * 60, max_stale=HOUR, stale_if_error=6 * HOUR, max_entries=2000, max_bytes=32 * MB),
+    CachePolicy("nws.alerts", ("https://api.weather.gov/alerts/*",),
+                ttl=60, max_stale=5 * 60, stale_if_error=HOUR, max_entries=200, max_bytes=16 * MB),
+    CachePolicy("usgs.sites", ("https://api.waterdata.usgs.gov/ogcapi/*/collections/monitoring-locations/*",),
+                ttl=DAY, max_stale=DAY, stale_if_error=7 * DAY, max_entries=100, max_bytes=32 * MB),
+    CachePolicy("usgs.observations", ("https://api.waterdata.usgs.gov/ogcapi/*/collections/observations/*",),
+                ttl=5 * 60, max_stale=15 * 60, stale_if_error=6 * HOUR, max_entries=500, max_bytes=64 * MB),
+    CachePolicy("transtar", ("https://traffic.houstontranstar.org/*",),
+                ttl=60, max_stale=5 * 60, stale_if_error=HOUR, max_entries=50, max_bytes=32 * MB),
+    CachePolicy("purpleair", ("https://api.purpleair.com/*",),
+                ttl=2 * 60, max_stale=5 * 60, stale_if_error=HOUR, max_entries=1000, max_bytes=32 * MB),
+    CachePolicy("airnow", ("https://www.airnowapi.org/*", "https://api.waqi.info/*"),
+                ttl=15 * 60, max_stale=30 * 60, stale_if_error=6 * HOUR, max_entries=500, max_bytes=8 * MB),
+    CachePolicy("ndbc", ("https://www.ndbc.noaa.gov/*",),
+                ttl=10 * 60, max_stale=30 * 60, stale_if_error=6 * HOUR, max_entries=500, max_bytes=8 * MB),
+    CachePolicy("aviation", ("https://www.connect.aviationweather.gov/*",),
+                ttl=5 * 60, max_stale=15 * 60, stale_if_error=2 * HOUR, max_entries=500, max_bytes=8 * MB),
+    CachePolicy("gbfs.meta", ("*/gbfs.json",),
+                ttl=HOUR, max_stale=DAY, stale_if_error=DAY, max_entries=10, max_bytes=MB),
+    CachePolicy("gbfs.status", ("*/station_status*",),
+                ttl=30, max_stale=60, stale_if_error=HOUR, max_entries=10, max_bytes=8 * MB),
+    CachePolicy("metro.gtfsrt", ttl=15, max_stale=30, stale_if_error=5 * 60, max_entries=10, max_bytes=64 * MB),
+]
+
+# Overrides, e.g. CACHE_POLICIES_JSON={"nws.alerts": {"ttl": 30}, "default": {"max_entries": 500}}
+policies_json = os.environ.get("CACHE_POLICIES_JSON","{}")
+try:
+    _overrides = json.loads(policies_json)
+    DEFAULT = replace(DEFAULT, **_overrides.get("default", {}))
+    POLICIES = [replace(p, **_overrides.get(p.name, {})) for p in POLICIES]
+except Exception as e:
+    logger.warning("ignoring invalid CACHE_POLICIES_JSON: %s", e)
+
+BY_NAME = {p.name: p for p in POLICIES}
+
+def policy_for(url: str, name: str | None = None) -> CachePolicy:
+    if name:
+        return BY_NAME.get(name, DEFAULT)
+    for p in POLICIES:
+        if p.matches(url):
+            return p
+    return DEFAULT
@@ -0,0 +1,113 @@
+import os, json, logging
+import httpx
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger("houston")
+
+TIMEOUT = int(os.environ.get("HTTP_TIMEOUT","30"))
+MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS","20"))
+MAX_KEEPALIVE = int(os.environ.get("HTTP_MAX_KEEPALIVE","10"))
+KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY","30"))
+HTTP2 = os.environ.get("HTTP2","false").lower() == "true"
+
+# Per-host timeouts, same shape as RATE_LIMITS_JSON: {"api.weather.gov": 10}
+timeouts_json = os.environ.get("HTTP_TIMEOUTS_JSON","{}")
+try:
+    PER_HOST_TIMEOUT = {k: float(v) for k,v in json.loads(timeouts_json).items()}
+except Exception:
+    PER_HOST_TIMEOUT = {}
+
+POOL_REQS = Counter("upstream_pool_requests_total", "Upstream requests sent through the client pool", ["host"])
+POOL_NEW = Counter("upstream_pool_connections_opened_total", "Upstream connections opened", ["host"])
+POOL_REUSED = Counter("upstream_pool_connections_reused_total", "Upstream requests served on a kept-alive connection", ["host"])
+POOL_CONNS = Gauge("upstream_pool_connections", "Upstream connections currently pooled", ["host","state"])
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("HTTP2=true but the h2 package is not installed; using HTTP/1.1")
+        return False
+
+class ClientPool:
+    """One long-lived httpx.AsyncClient per upstream host.
+
+    Clients are created lazily on first use and closed by the app lifespan,
+    so keep-alive connections are reused across cache misses.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport | None = None):
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._transport = transport
+        self._http2 = HTTP2 and _http2_available()
+        self._opened: dict[str, int] = {}
+        self._reused: dict[str, int] = {}
+
+    def _new_client(self, host: str) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE,
+                              keepalive_expiry=KEEPALIVE_EXPIRY)
+        timeout = PER_HOST_TIMEOUT.get(host, TIMEOUT)
+        return httpx.AsyncClient(timeout=timeout, limits=limits, http2=self._http2, transport=self._transport)
+
+    def client_for(self, url: str) -> httpx.AsyncClient:
+        host = httpx.URL(url).host
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            client = self._clients[host] = self._new_client(host)
+        return client
+
+    async def get(self, url: str, headers: dict | None = None, params: dict | None = None) -> httpx.Response:
+        host = httpx.URL(url).host
+        events = set()
+
+        async def trace(event, info):
+            events.add(event)
+
+        r = await self.client_for(url).get(url, params=params, headers=headers or {},
+                                           extensions={"trace": trace})
+        POOL_REQS.labels(host).inc()
+        # httpcore reports each request it sends; a transport that isn't httpcore (tests) reports nothing
+        if "connection.connect_tcp.complete" in events:
+            self._opened[host] = self._opened.get(host, 0) + 1
+            POOL_NEW.labels(host).inc()
+        elif events & {"http11.send_request_headers.started", "http2.send_request_headers.started"}:
+            self._reused[host] = self._reused.get(host, 0) + 1
+            POOL_REUSED.labels(host).inc()
+        return r
+
+    @staticmethod
+    def _connections(client: httpx.AsyncClient) -> list | None:
+        """The client's pooled httpcore connections, or None if this httpx/httpcore doesn't expose them."""
+        try:
+            # private API (httpx.AsyncHTTPTransport._pool.connections); may move between releases
+            return list(client._transport._pool.connections)
+        except AttributeError:
+            return None
+
+    def stats(self) -> dict:
+        """Per host: connections opened and requests sent on a reused one (from httpcore's trace events),
+        plus the connections currently pooled and how many are idle (None when unavailable)."""
+        out = {}
+        for host, client in self._clients.items():
+            conns = self._connections(client)
+            try:
+                idle = None if conns is None else sum(1 for c in conns if c.is_idle())
+            except AttributeError:
+                conns = idle = None
+            out[host] = {"opened": self._opened.get(host, 0), "reused": self._reused.get(host, 0),
+                         "open": None if conns is None else len(conns), "idle": idle}
+        return out
+
+    def update_metrics(self):
+        for host, s in self.stats().items():
+            if s["open"] is not None:
+                POOL_CONNS.labels(host, "open").set(s["open"])
+                POOL_CONNS.labels(host, "idle").set(s["idle"])
+
+    async def aclose(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+pool = ClientPool()
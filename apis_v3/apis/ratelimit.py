@@ -0,0 +1,113 @@
+import os, json, time, asyncio, fcntl, logging
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from prometheus_client import Histogram
+
+logger = logging.getLogger("houston")
+
+# Where limiter state lives: "" (this process only) or file:///path shared by every worker on the node
+RATE_LIMIT_STATE = os.environ.get("RATE_LIMIT_STATE","")
+# Never honour an upstream Retry-After longer than this
+MAX_RETRY_AFTER = float(os.environ.get("RATE_LIMIT_MAX_RETRY_AFTER","300"))
+
+WAIT = Histogram("upstream_rate_limit_wait_seconds", "Time spent queued for an upstream rate limit token", ["host"],
+                 buckets=(0, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60))
+
+class MemoryStore:
+    """Limiter state for a single process."""
+
+    def __init__(self):
+        self._state: dict[str, float] = {}
+
+    async def update(self, key: str, fn):
+        new, result = fn(self._state.get(key))
+        self._state[key] = new
+        return result
+
+class FileStore:
+    """Limiter state in a small JSON file, updated under flock so all workers on a node share it."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _update(self, key, fn):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            raw = b""
+            while chunk := os.read(fd, 65536):
+                raw += chunk
+            try:
+                state = json.loads(raw) if raw else {}
+            except ValueError:
+                state = {}
+            new, result = fn(state.get(key))
+            state[key] = new
+            data = json.dumps(state).encode()
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, data)
+            return result
+        finally:
+            os.close(fd)  # releases the lock
+
+    async def update(self, key: str, fn):
+        return await asyncio.to_thread(self._update, key, fn)
+
+def store_from_url(url: str = RATE_LIMIT_STATE):
+    if url.startswith("file://"):
+        return FileStore(urlparse(url).path)
+    if url:
+        logger.warning("unsupported RATE_LIMIT_STATE %s, using per-process limits", url)
+    return MemoryStore()
+
+default_store = store_from_url()
+
+class TokenBucket:
+    """Token bucket kept as a GCRA theoretical arrival time (one float per host).
+
+    Callers reserve a slot and sleep until it comes up, like aiolimiter, but the
+    state is a single value in a pluggable store so workers can share it.
+    A rate <= 0 means no limit; upstream Retry-After pauses still apply.
+    """
+
+    def __init__(self, key: str, rate: float, burst: float | None = None, store=None):
+        self.key = key
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.tolerance = (max(1.0, burst or rate) - 1) * self.interval
+        self.store = store if store is not None else default_store
+
+    def _reserve(self, tat):
+        now = time.time()
+        tat = max(tat or now, now)
+        return tat + self.interval, max(0.0, tat - self.tolerance - now)
+
+    async def acquire(self):
+        wait = await self.store.update(self.key, self._reserve)
+        WAIT.labels(self.key).observe(wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def pause(self, seconds: float):
+        """Hold every caller of this bucket back for `seconds` (upstream Retry-After)."""
+        until = time.time() + min(seconds, MAX_RETRY_AFTER)
+        await self.store.update(self.key, lambda tat: (max(tat or 0.0, until + self.tolerance), None))
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+def parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,35 @@
+import inspect, functools
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+
+class ORJSONResponse(JSONResponse):
+    """JSON rendered with orjson; falls back to jsonable_encoder for types orjson can't handle."""
+
+    def render(self, content) -> bytes:
+        try:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return orjson.dumps(jsonable_encoder(content), option=orjson.OPT_NON_STR_KEYS)
+
+class ORJSONRoute(APIRoute):
+    """Route that hands plain endpoint results straight to ORJSONResponse.
+
+    FastAPI otherwise runs every dict through jsonable_encoder before the
+    response class sees it, which costs more than the JSON encoding itself on
+    large payloads (GTFS-rt entity lists, USGS observations).
+    """
+
+    def __init__(self, path, endpoint, **kwargs):
+        if inspect.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def wrapped(*args, **kw):
+                result = await endpoint(*args, **kw)
+                return result if isinstance(result, Response) else ORJSONResponse(result)
+        else:
+            @functools.wraps(endpoint)
+            def wrapped(*args, **kw):
+                result = endpoint(*args, **kw)
+                return result if isinstance(result, Response) else ORJSONResponse(result)
+        super().__init__(path, wrapped, **kwargs)
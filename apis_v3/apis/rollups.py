@@ -0,0 +1,185 @@
+import os, asyncio, logging
+from dataclasses import dataclass
+from datetime import timedelta
+import duckdb
+from prometheus_client import Counter
+from apis import history
+
+logger = logging.getLogger("houston")
+
+# DuckDB file holding the rollup tables and their watermarks (one process at a time may open it)
+ROLLUP_DB = os.environ.get("ROLLUP_DB","rollups.duckdb")
+# Fold newly archived rows into the rollups this often while the archiver runs ("0" disables)
+ROLLUP_SECONDS = float(os.environ.get("ROLLUP_SECONDS","300"))
+# Partitions are searched from this many days before a bucket, for readings archived before their own timestamp
+ROLLUP_LATE_DAYS = int(os.environ.get("ROLLUP_LATE_DAYS","1"))
+
+TIERS = {"5min": "5 minutes", "hour": "1 hour", "day": "1 day"}
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+ROWS = Counter("rollup_rows_total", "Archived rows folded into the rollup tables", ["source"])
+ERRORS = Counter("rollup_errors_total", "Rollup refresh failures", ["source"])
+
+@dataclass(frozen=True)
+class RollupSpec:
+    source: str    # archived source name
+    device: str    # SQL expression for the device key
+    time: str      # SQL expression for the reading time (TIMESTAMPTZ)
+    metrics: dict  # metric name -> archived column; columns a source doesn't have are skipped
+    unique: bool = False  # one reading per (device, time): the archive may hold redelivered copies
+
+SPECS = [
+    RollupSpec("purpleair.region", "CAST(sensor_index AS VARCHAR)", "to_timestamp(fetched_at)",
+               {"pm25": "pm2.5_atm", "humidity": "humidity", "temperature": "temperature"}),
+    # readings from the Kafka consumer; "timestamp" is epoch milliseconds as sent by the devices
+    RollupSpec("air_quality", "CAST(device_id AS VARCHAR)", 'to_timestamp(CAST("timestamp" AS BIGINT) / 1000.0)',
+               {"pm25": "pm25", "pm10": "pm10", "temperature": "temperature", "humidity": "humidity"}, unique=True),
+]
+
+def table_name(source: str, tier: str) -> str:
+    return history._ident(f"{source}_{tier}")
+
+class RollupStore:
+    """5-minute, hourly and daily per-device aggregates of archived readings.
+
+    Every metric gets count/min/max/mean and approximate p50/p90/p99 per
+    (bucket, device), stored long-format in one small DuckDB table per source
+    and tier. A refresh only reads rows archived after the source's watermark
+    (the last fetched_at folded in): it finds the buckets those rows touch and
+    recomputes just those from the raw partitions since then, so re-running
+    is idempotent and late rows in an old bucket are merged correctly.
+    """
+
+    def __init__(self, db_path: str = ROLLUP_DB, specs=SPECS, late_days: int = ROLLUP_LATE_DAYS):
+        self.db_path = db_path
+        self.specs = {s.source: s for s in specs}
+        self.late_days = late_days
+        self._con = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def con(self) -> duckdb.DuckDBPyConnection:
+        if self._con is None:
+            con = duckdb.connect(self.db_path)
+            con.execute("SET TimeZone = 'UTC'")
+            con.execute("CREATE TABLE IF NOT EXISTS rollup_watermarks (source VARCHAR PRIMARY KEY, watermark BIGINT)")
+            self._con = con
+        return self._con
+
+    def watermark(self, source: str) -> int:
+        row = self.con.cursor().execute("SELECT watermark FROM rollup_watermarks WHERE source = ?", [source]).fetchone()
+        return row[0] if row else 0
+
+    def refresh(self) -> dict[str, int]:
+        """Fold new rows of every source into its rollups; returns {source: new rows}. Blocking."""
+        out = {}
+        for spec in self.specs.values():
+            try:
+                out[spec.source] = n = self.refresh_source(spec)
+            except duckdb.Error as e:
+                ERRORS.labels(spec.source).inc()
+                logger.warning("rollup of %s failed: %s", spec.source, e)
+                continue
+            ROWS.labels(spec.source).inc(n)
+        return out
+
+    def refresh_source(self, spec: RollupSpec) -> int:
+        src = history.scan(spec.source)
+        if src is None:
+            return 0
+        con = self.con.cursor()
+        columns = {r[0] for r in con.execute(f"DESCRIBE SELECT * FROM {src}").fetchall()}
+        metrics = {m: c for m, c in spec.metrics.items() if c in columns}
+        if not metrics:
+            return 0
+        wm = self.watermark(spec.source)
+        values = ", ".join(f"CAST({history._ident(c)} AS DOUBLE) AS {history._ident(m)}" for m, c in metrics.items())
+        distinct = f"DISTINCT ON ({spec.device}, {spec.time}) " if spec.unique else ""
+        readings = (f"SELECT {distinct}{spec.device} AS device, {spec.time} AS ts, {values} FROM {src} "
+                    f"WHERE date >= ? AND {spec.device} IS NOT NULL AND {spec.time} IS NOT NULL")
+
+        con.execute("BEGIN TRANSACTION")
+        try:
+            # >= rather than >: rows of the watermark's own second archived after the last run still count;
+            # their buckets are simply recomputed again
+            con.execute(f"CREATE OR REPLACE TEMP TABLE fresh AS SELECT {spec.device} AS device, {spec.time} AS ts, "
+                        f"fetched_at FROM {src} WHERE date >= to_timestamp(?)::DATE AND fetched_at >= ? "
+                        f"AND {spec.device} IS NOT NULL AND {spec.time} IS NOT NULL", [wm, wm])
+            new, top = con.execute("SELECT count(*) FILTER (fetched_at > ?), max(fetched_at) FROM fresh", [wm]).fetchone()
+            if not new:
+                con.execute("ROLLBACK")
+                return 0
+            unpivot = ", ".join(history._ident(m) for m in metrics)
+            stats = ", ".join(f"approx_quantile(value, {q}) AS {name}" for name, q in QUANTILES.items())
+            for tier, width in TIERS.items():
+                t = table_name(spec.source, tier)
+                con.execute(f"CREATE TABLE IF NOT EXISTS {t} (bucket TIMESTAMPTZ, device VARCHAR, metric VARCHAR, "
+                            f"n BIGINT, min DOUBLE, max DOUBLE, mean DOUBLE, "
+                            f"{', '.join(f'{name} DOUBLE' for name in QUANTILES)})")
+                con.execute(f"CREATE OR REPLACE TEMP TABLE touched AS "
+                            f"SELECT DISTINCT time_bucket(INTERVAL '{width}', ts) AS bucket, device FROM fresh")
+                lo = con.execute("SELECT min(bucket)::DATE FROM touched").fetchone()[0]
+                # readings are partitioned by the day they were archived, which can be any time after their own
+                # (a replayed topic, a backfill), so every partition from the oldest touched bucket on is searched
+                since = lo - timedelta(days=self.late_days)
+                con.execute(f"DELETE FROM {t} USING touched WHERE {t}.bucket = touched.bucket "
+                            f"AND {t}.device = touched.device")
+                con.execute(f"INSERT INTO {t} SELECT bucket, device, metric, count(value), min(value), max(value), "
+                            f"avg(value), {stats} FROM (UNPIVOT (SELECT time_bucket(INTERVAL '{width}', ts) AS bucket, "
+                            f"device, {unpivot} FROM ({readings})) ON {unpivot} INTO NAME metric VALUE value) "
+                            f"SEMI JOIN touched USING (bucket, device) GROUP BY ALL", [since])
+            con.execute("INSERT OR REPLACE INTO rollup_watermarks VALUES (?, ?)", [spec.source, top])
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        return new
+
+    async def _loop(self, interval: float):
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.warning("rollup refresh failed: %s", e)
+            await asyncio.sleep(interval)
+
+    def start(self, interval: float = ROLLUP_SECONDS):
+        if self._task is None and interval > 0:
+            self._task = asyncio.ensure_future(self._loop(interval))
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._con is not None:
+            self._con.close()
+            self._con = None
+
+    async def query(self, source: str, tier: str = "hour", metric: str = "pm25", device: str | None = None,
+                    days: float = 7, fmt: str = "ndjson", limit: int = history.HISTORY_MAX_ROWS):
+        """Pre-aggregated rows for one metric over the last `days` days, oldest bucket first."""
+        spec = self.specs.get(source)
+        if spec is None:
+            return {"error": f"source must be one of {','.join(self.specs)}"}
+        if tier not in TIERS:
+            return {"error": f"tier must be one of {','.join(TIERS)}"}
+        if metric not in spec.metrics:
+            return {"error": f"metric must be one of {','.join(spec.metrics)}"}
+        name = f"{source}_{tier}"
+        try:
+            exists = await asyncio.to_thread(lambda: self.con.cursor().execute(
+                "SELECT count(*) FROM duckdb_tables() WHERE table_name = ?", [name]).fetchone()[0])
+        except duckdb.Error as e:  # e.g. the file is held by scripts/rollup.py
+            return {"error": f"Rollups unavailable: {e}"}
+        if not exists:
+            return {"error": f"No rollups for {source}"}
+        _, since = history._window(days)
+        where, params = "metric = ? AND bucket >= to_timestamp(?)", [metric, since]
+        if device is not None:
+            where += " AND device = ?"
+            params.append(device)
+        return await history.run(f"SELECT * FROM {table_name(source, tier)} WHERE {where} ORDER BY bucket, device",
+                                 params, fmt, limit, con=self.con)
+
+store = RollupStore()
@@ -1,5 +1,24 @@
-from apis.utils import get_json
+from apis.utils import get_json, split_ids, BATCH_MAX_ITEMS, describe_error
 BASE = "https://www.connect.aviationweather.gov/data/api"
 async def get_metar(icao: str):
     url = f"{BASE}/metar?ids={icao}&format=json"
     return await get_json(url)
+
+async def get_metars(ids: str):
+    """Several stations in one upstream call (the API takes a comma-separated ids list), keyed by station."""
+    wanted = [i.upper() for i in split_ids(ids)]
+    if not wanted:
+        return {"error": "No ids given"}
+    if len(wanted) > BATCH_MAX_ITEMS:
+        return {"error": f"At most {BATCH_MAX_ITEMS} ids per request"}
+    try:
+        reports = await get_metar(",".join(wanted))
+    except Exception as e:
+        msg = describe_error(e)
+        return {"count": 0, "results": {}, "errors": {i: msg for i in wanted}}
+    results = {}
+    for r in reports or []:
+        results.setdefault(str(r.get("icaoId", "")).upper(), []).append(r)
+    results = {i: results[i] for i in wanted if i in results}
+    return {"count": len(results), "results": results,
+            "errors": {i: "No METAR returned" for i in wanted if i not in results}}
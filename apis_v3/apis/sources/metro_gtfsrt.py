@@ -1,52 +1,222 @@
-import os
+import os, time
+from bisect import bisect_left
+import pyarrow as pa
+import pyarrow.compute as pc
 from google.transit import gtfs_realtime_pb2
-from apis.utils import get_text
+from apis.utils import get_raw
+from apis.stream import FeedBroadcaster
 
 VEHICLE_POS_URL = os.environ.get("METRO_VEHICLE_POS_URL", "")
 TRIP_UPDATES_URL = os.environ.get("METRO_TRIP_UPDATES_URL", "")
+STREAM_INTERVAL = float(os.environ.get("METRO_STREAM_INTERVAL","5"))
+# Per-stop arrivals kept in the trip-update index, and the most one /metro/stop_arrivals call returns
+STOP_INDEX_DEPTH = int(os.environ.get("METRO_STOP_INDEX_DEPTH","32"))
+STOP_ARRIVALS_MAX = 50
 HEADERS = {"Ocp-Apim-Subscription-Key": os.environ.get("METRO_API_KEY","")} if os.environ.get("METRO_API_KEY") else {}
 
-def decode_feed(raw_bytes: bytes):
-    feed = gtfs_realtime_pb2.FeedMessage()
-    feed.ParseFromString(raw_bytes)
+def _vehicle(v):
+    trip, pos = v.trip, v.position
+    return {
+        "trip_id": trip.trip_id,
+        "route_id": trip.route_id,
+        "lat": pos.latitude,
+        "lon": pos.longitude,
+        "bearing": pos.bearing,
+        "timestamp": v.timestamp,
+        "stop_id": v.stop_id,
+        "current_stop_sequence": v.current_stop_sequence,
+    }
+
+def _trip_update(tu):
+    trip = tu.trip
+    return {
+        "trip_id": trip.trip_id,
+        "route_id": trip.route_id,
+        "timestamp": tu.timestamp,
+        "stops": [{"stop_id": u.stop_id, "arrival": u.arrival.time, "departure": u.departure.time}
+                  for u in tu.stop_time_update],
+    }
+
+def _entities(feed):
     entities = []
+    append = entities.append
     for e in feed.entity:
         d = {"id": e.id}
         if e.HasField("vehicle"):
-            v = e.vehicle
-            d["vehicle"] = {
-                "trip_id": getattr(getattr(v, "trip", None), "trip_id", None),
-                "route_id": getattr(getattr(v, "trip", None), "route_id", None),
-                "lat": getattr(getattr(v, "position", None), "latitude", None),
-                "lon": getattr(getattr(v, "position", None), "longitude", None),
-                "bearing": getattr(getattr(v, "position", None), "bearing", None),
-                "timestamp": getattr(v, "timestamp", None),
-                "stop_id": getattr(v, "stop_id", None),
-                "current_stop_sequence": getattr(v, "current_stop_sequence", None),
-            }
+            d["vehicle"] = _vehicle(e.vehicle)
         if e.HasField("trip_update"):
-            tu = e.trip_update
-            d["trip_update"] = {
-                "trip_id": getattr(getattr(tu, "trip", None), "trip_id", None),
-                "route_id": getattr(getattr(tu, "trip", None), "route_id", None),
-                "timestamp": getattr(tu, "timestamp", None),
-                "stops": [{
-                    "stop_id": u.stop_id,
-                    "arrival": getattr(getattr(u, "arrival", None), "time", None),
-                    "departure": getattr(getattr(u, "departure", None), "time", None),
-                } for u in getattr(tu, "stop_time_update", [])]
-            }
-        entities.append(d)
+            d["trip_update"] = _trip_update(e.trip_update)
+        append(d)
     return {"entities": entities}
 
+def decode_feed(raw_bytes: bytes):
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.ParseFromString(raw_bytes)
+    return _entities(feed)
+
+VEHICLE_FIELDS = ("id", "trip_id", "route_id", "lat", "lon", "bearing", "timestamp", "stop_id", "current_stop_sequence")
+_VEHICLE_TYPES = {"lat": pa.float32(), "lon": pa.float32(), "bearing": pa.float32(),
+                  "timestamp": pa.uint64(), "current_stop_sequence": pa.uint32()}
+
+def vehicle_table(entities) -> pa.Table:
+    """Columnar snapshot of the vehicle entities: one array per field."""
+    vs = [(e["id"], e["vehicle"]) for e in entities if "vehicle" in e]
+    cols = {"id": pa.array([i for i, _ in vs], pa.string())}
+    for f in VEHICLE_FIELDS[1:]:
+        cols[f] = pa.array([v[f] for _, v in vs], _VEHICLE_TYPES.get(f, pa.string()))
+    return pa.table(cols)
+
+def stop_index(entities, since: int = 0, depth: int = STOP_INDEX_DEPTH) -> dict[str, tuple[list, list]]:
+    """stop_id -> (times, rows) sorted by time, for bisecting "next arrivals at stop X".
+
+    rows are (trip_id, route_id, arrival, departure) tuples. Updates earlier than
+    `since` (already served) are dropped and only the first `depth` per stop are
+    kept, so a large feed costs at most depth rows per stop.
+    """
+    by_stop: dict[str, list] = {}
+    for e in entities:
+        tu = e.get("trip_update")
+        if tu is None:
+            continue
+        trip_id, route_id = tu["trip_id"], tu["route_id"]
+        for u in tu["stops"]:
+            t = u["arrival"] or u["departure"]
+            if t and t >= since:
+                by_stop.setdefault(u["stop_id"], []).append((t, trip_id, route_id, u["arrival"], u["departure"]))
+    index = {}
+    for stop_id, rows in by_stop.items():
+        rows.sort()
+        del rows[depth:]
+        index[stop_id] = ([r[0] for r in rows], [r[1:] for r in rows])
+    return index
+
+class _Decoded:
+    __slots__ = ("raw", "timestamp", "result", "_vehicles", "_stops")
+
+    def __init__(self, raw, timestamp, result):
+        self.raw, self.timestamp, self.result = raw, timestamp, result
+        self._vehicles = None
+        self._stops = None
+
+    @property
+    def vehicles(self) -> pa.Table:
+        if self._vehicles is None:
+            self._vehicles = vehicle_table(self.result["entities"])
+        return self._vehicles
+
+    @property
+    def stops(self) -> dict[str, tuple[list, list]]:
+        if self._stops is None:
+            # keep predictions up to a minute older than the feed; anything before that has left
+            self._stops = stop_index(self.result["entities"], since=self.timestamp - 60 if self.timestamp else 0)
+        return self._stops
+
+def _header_timestamp(raw: bytes) -> int:
+    """Read FeedMessage.header.timestamp without parsing the entities.
+
+    The header is field 1 (tag 0x0A), which encoders write first; anything
+    else returns 0 and the caller falls back to a full parse.
+    """
+    if not raw or raw[0] != 0x0A:
+        return 0
+    size, shift, pos = 0, 0, 1
+    while pos < len(raw):
+        b = raw[pos]
+        pos += 1
+        size |= (b & 0x7F) << shift
+        shift += 7
+        if not b & 0x80:
+            header = gtfs_realtime_pb2.FeedHeader()
+            try:
+                header.ParseFromString(raw[pos:pos + size])
+            except Exception:
+                return 0
+            return header.timestamp
+    return 0
+
+# url -> last decoded feed; reused while the cached bytes or the feed header timestamp are unchanged
+_decoded: dict[str, _Decoded] = {}
+
+def decode_cached(url: str, raw: bytes) -> _Decoded:
+    prev = _decoded.get(url)
+    if prev is not None and prev.raw is raw:
+        return prev
+    ts = _header_timestamp(raw)
+    if prev is not None and ts and prev.timestamp == ts:
+        prev.raw = raw
+        return prev
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.ParseFromString(raw)
+    ts = feed.header.timestamp
+    d = _decoded[url] = _Decoded(raw, ts, _entities(feed))
+    return d
+
+async def feed(url: str, max_age: float | None = None) -> _Decoded:
+    body = await get_raw(url, headers=HEADERS, policy="metro.gtfsrt", max_age=max_age)
+    return decode_cached(url, body.content)
+
 async def get_vehicle_positions():
     if not VEHICLE_POS_URL:
         return {"error": "Set METRO_VEHICLE_POS_URL env to your GTFS‑rt endpoint"}
-    raw = await get_text(VEHICLE_POS_URL, headers=HEADERS)
-    return decode_feed(raw.encode("latin1"))
+    return (await feed(VEHICLE_POS_URL)).result
+
+def filter_vehicles(table: pa.Table, route_id: str | None = None, bbox: str | None = None,
+                    fields: str | None = None) -> pa.Table:
+    """Filter/project a vehicle snapshot with vectorized compute kernels.
+
+    route_id: comma-separated route ids; bbox: "minlon,minlat,maxlon,maxlat";
+    fields: comma-separated subset of VEHICLE_FIELDS.
+    """
+    mask = None
+    if route_id:
+        mask = pc.is_in(table["route_id"], value_set=pa.array(route_id.split(","), pa.string()))
+    if bbox:
+        minlon, minlat, maxlon, maxlat = (float(x) for x in bbox.split(","))
+        inside = pc.and_(pc.and_(pc.greater_equal(table["lon"], minlon), pc.less_equal(table["lon"], maxlon)),
+                         pc.and_(pc.greater_equal(table["lat"], minlat), pc.less_equal(table["lat"], maxlat)))
+        mask = inside if mask is None else pc.and_(mask, inside)
+    if mask is not None:
+        table = table.filter(mask)
+    if fields:
+        names = fields.split(",")
+        unknown = [f for f in names if f not in VEHICLE_FIELDS]
+        if unknown:
+            raise ValueError(f"unknown fields: {','.join(unknown)}")
+        table = table.select(names)
+    return table
+
+async def vehicle_snapshot(route_id: str | None = None, bbox: str | None = None, fields: str | None = None):
+    if not VEHICLE_POS_URL:
+        return {"error": "Set METRO_VEHICLE_POS_URL env to your GTFS‑rt endpoint"}
+    d = await feed(VEHICLE_POS_URL)
+    try:
+        table = filter_vehicles(d.vehicles, route_id, bbox, fields)
+    except ValueError as e:
+        return {"error": f"Bad filter: {e}"}
+    return {"timestamp": d.timestamp, "count": table.num_rows, "vehicles": table.to_pylist()}
+
+async def _vehicle_items():
+    # every poll revalidates: served from the cache, deltas could trail the feed by the policy's ttl + max_stale
+    d = await feed(VEHICLE_POS_URL, max_age=STREAM_INTERVAL)
+    return d, {row["id"]: row for row in d.vehicles.to_pylist()}
+
+# One poll loop for all /metro/vehicle_positions/stream clients
+vehicle_stream = FeedBroadcaster("metro.vehicle_positions", _vehicle_items, STREAM_INTERVAL)
 
 async def get_trip_updates():
     if not TRIP_UPDATES_URL:
         return {"error": "Set METRO_TRIP_UPDATES_URL env to your GTFS‑rt endpoint"}
-    raw = await get_text(TRIP_UPDATES_URL, headers=HEADERS)
-    return decode_feed(raw.encode("latin1"))
+    return (await feed(TRIP_UPDATES_URL)).result
+
+def next_arrivals(index, stop_id: str, after: int, limit: int = 10) -> list[dict]:
+    times, rows = index.get(stop_id, ((), ()))
+    i = bisect_left(times, after)
+    return [{"trip_id": r[0], "route_id": r[1], "arrival": r[2], "departure": r[3]} for r in rows[i:i + limit]]
+
+async def stop_arrivals(stop_id: str, limit: int = 10, after: int | None = None):
+    if not TRIP_UPDATES_URL:
+        return {"error": "Set METRO_TRIP_UPDATES_URL env to your GTFS‑rt endpoint"}
+    d = await feed(TRIP_UPDATES_URL)
+    after = int(time.time()) if after is None else after
+    arrivals = next_arrivals(d.stops, stop_id, after, max(1, min(limit, STOP_ARRIVALS_MAX)))
+    return {"timestamp": d.timestamp, "stop_id": stop_id, "arrivals": arrivals}
@@ -1,4 +1,164 @@
-from apis.utils import get_text
-async def fetch_latest(station: str):
-    url = f"https://www.ndbc.noaa.gov/data/latest_obs/{station}.txt"
-    return {"station": station, "raw": await get_text(url)}
+import os, re, math, time
+from array import array
+from calendar import timegm
+import pyarrow as pa
+from apis.utils import get_text, get_parsed, gather_items, split_ids
+
+BASE = "https://www.ndbc.noaa.gov/data/latest_obs"
+# Observations kept per station in the in-process history (30 days of 10-minute reports)
+HISTORY_MAX = int(os.environ.get("NDBC_HISTORY_MAX","4320"))
+
+# latest_obs "Label: value unit" lines -> typed field names
+LABELS = {
+    "wind": "wind_speed_kt", "gust": "gust_kt", "seas": "wave_height_ft", "peak period": "dominant_period_s",
+    "pres": "pressure_in", "air temp": "air_temp_f", "water temp": "water_temp_f", "dew point": "dew_point_f",
+    "vis": "visibility_nmi", "tide": "tide_ft", "swell": "swell_height_ft", "period": "swell_period_s",
+    "wind wave": "wind_wave_height_ft", "ave. period": "average_period_s",
+}
+# Labels that mean something else inside a block: "Period:" after "Wind Wave:" is the wind-wave period
+BLOCK_LABELS = {"wind wave": {"period": "wind_wave_period_s"}}
+# realtime2-style fixed-width columns -> the same names (units: m/s, m, hPa, degC as NOAA publishes them)
+COLUMNS = {
+    "WDIR": "wind_dir_deg", "WSPD": "wind_speed_ms", "GST": "gust_ms", "WVHT": "wave_height_m",
+    "DPD": "dominant_period_s", "APD": "average_period_s", "MWD": "wave_dir_deg", "PRES": "pressure_hpa",
+    "ATMP": "air_temp_c", "WTMP": "water_temp_c", "DEWP": "dew_point_c", "VIS": "visibility_nmi",
+    "PTDY": "pressure_tendency_hpa", "TIDE": "tide_ft",
+}
+HISTORY_FIELDS = tuple(dict.fromkeys((*LABELS.values(), "wind_wave_period_s", *COLUMNS.values(), "wind_dir_deg")))
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_GMT = re.compile(r"(\d{2})(\d{2})\s+GMT\s+(\d{2})/(\d{2})/(\d{2})")
+_POS = re.compile(r"(\d+(?:\.\d+)?)°\s*(?:(\d+(?:\.\d+)?)')?\s*([NS])\W+(\d+(?:\.\d+)?)°\s*(?:(\d+(?:\.\d+)?)')?\s*([EW])")
+_WIND_DIR = re.compile(r"^([NSEW]{1,3})?\s*\((\d+)°\)")
+
+def _num(value: str):
+    """First number in value, or None for NOAA's "MM" (missing) and other non-numeric text."""
+    if value.strip().upper().startswith("MM"):
+        return None
+    m = _NUMBER.search(value)
+    return float(m.group()) if m else None
+
+def _parse_table(text: str) -> dict:
+    """Latest row of a fixed-width realtime2 file ("#YY MM DD hh mm WDIR ..." header, newest first)."""
+    lines = [l.split() for l in text.splitlines() if l.strip()]
+    header = [h.lstrip("#") for h in lines[0]]
+    row = next((l for l in lines[1:] if not l[0].startswith("#")), None)
+    obs = {"time": None}
+    if row is None:
+        return obs
+    cols = dict(zip(header, row))
+    try:
+        obs["time"] = timegm((int(cols["YY"]), int(cols["MM"]), int(cols["DD"]), int(cols["hh"]), int(cols["mm"]), 0))
+    except (KeyError, ValueError):
+        pass
+    for col, name in COLUMNS.items():
+        if col in cols:
+            obs[name] = _num(cols[col])
+    return obs
+
+def parse_latest_obs(text: str) -> dict:
+    """Typed fields from an NDBC latest_obs report; missing ("MM") values become None, times are epoch seconds UTC."""
+    if text.lstrip().startswith("#"):
+        return _parse_table(text)
+    obs = {"time": None, "lat": None, "lon": None}
+    block = None  # "swell" / "wind wave" once their heading line is seen; their Period/Direction lines follow
+    for line in text.splitlines():
+        line = line.strip()
+        if m := _GMT.search(line):
+            hh, mi, mo, dd, yy = (int(x) for x in m.groups())
+            obs["time"] = timegm((2000 + yy, mo, dd, hh, mi, 0))
+        elif m := _POS.search(line):
+            lat = float(m[1]) + float(m[2] or 0) / 60
+            lon = float(m[4]) + float(m[5] or 0) / 60
+            obs["lat"], obs["lon"] = (-lat if m[3] == "S" else lat), (-lon if m[6] == "W" else lon)
+        elif ":" in line and not line.lower().startswith("station"):
+            label, value = (x.strip() for x in line.split(":", 1))
+            label = label.lower()
+            if label in ("swell", "wind wave"):
+                block = label
+            name = BLOCK_LABELS.get(block, {}).get(label) or LABELS.get(label)
+            if name is None:
+                continue
+            if label == "wind" and (d := _WIND_DIR.match(value)):
+                obs["wind_dir"], obs["wind_dir_deg"] = d[1], float(d[2])
+                value = value[d.end():]
+            obs[name] = _num(value)
+            if label == "pres":
+                obs["pressure_tendency"] = next((w for w in ("rising", "falling", "steady") if w in value.lower()), None)
+    return obs
+
+class ObsHistory:
+    """Per-station columnar history: one packed array per numeric field, NaN for missing.
+
+    Only observations newer than the last one recorded are appended, so
+    re-reading a cached report is free; each station keeps at most `max_rows`.
+    """
+
+    def __init__(self, fields=HISTORY_FIELDS, max_rows: int = HISTORY_MAX):
+        self.fields = fields
+        self.max_rows = max_rows
+        self.stations: dict[str, tuple[array, dict[str, array]]] = {}
+
+    def record(self, station: str, obs: dict) -> bool:
+        t = obs.get("time")
+        if t is None:
+            return False
+        times, cols = self.stations.setdefault(station, (array("q"), {f: array("d") for f in self.fields}))
+        if times and t <= times[-1]:
+            return False
+        times.append(t)
+        for f, col in cols.items():
+            v = obs.get(f)
+            col.append(math.nan if v is None else v)
+        if len(times) > self.max_rows:
+            drop = len(times) - self.max_rows
+            del times[:drop]
+            for col in cols.values():
+                del col[:drop]
+        return True
+
+    def table(self, station: str, since: int = 0, fields=None) -> pa.Table:
+        times, cols = self.stations.get(station, (array("q"), {f: array("d") for f in self.fields}))
+        start = next((i for i, t in enumerate(times) if t >= since), len(times))
+        names = [f for f in (fields or self.fields) if f in cols]
+        data = {"time": pa.array(times[start:], pa.int64())}
+        for f in names:
+            data[f] = pa.array(cols[f][start:].tolist(), pa.float64(), from_pandas=True)  # NaN -> null
+        return pa.table(data)
+
+history = ObsHistory()
+
+def trend(times: list, values: list) -> dict | None:
+    """min/max/mean and least-squares slope per hour over the non-null values."""
+    pts = [(t, v) for t, v in zip(times, values) if v is not None]
+    if not pts:
+        return None
+    n = len(pts)
+    mt = sum(t for t, _ in pts) / n
+    mv = sum(v for _, v in pts) / n
+    var = sum((t - mt) ** 2 for t, _ in pts)
+    slope = sum((t - mt) * (v - mv) for t, v in pts) / var * 3600 if var else 0.0
+    return {"min": min(v for _, v in pts), "max": max(v for _, v in pts), "mean": mv, "slope_per_hour": slope}
+
+async def fetch_latest(station: str, raw: bool = False):
+    url = f"{BASE}/{station}.txt"
+    obs = await get_parsed(url, parse_latest_obs)
+    history.record(station, obs)
+    out = {"station": station, "observation": obs}
+    if raw:
+        out["raw"] = await get_text(url)
+    return out
+
+async def fetch_latest_many(stations: str):
+    return await gather_items(split_ids(stations), fetch_latest)
+
+def get_history(station: str, hours: float = 24, fields: str | None = None):
+    names = split_ids(fields) if fields else None
+    if names and (unknown := [f for f in names if f not in HISTORY_FIELDS]):
+        return {"error": f"unknown fields: {','.join(unknown)}"}
+    t = history.table(station, since=int(time.time() - hours * 3600), fields=names)
+    times = t["time"].to_pylist()
+    columns = {f: t[f].to_pylist() for f in t.column_names[1:]}
+    columns = {f: v for f, v in columns.items() if names or any(x is not None for x in v)}
+    return {"station": station, "count": t.num_rows, "time": times, "columns": columns,
+            "trend": {f: trend(times, v) for f, v in columns.items()}}
@@ -1,16 +1,63 @@
-from apis.utils import get_json
+import os, logging
+from apis.utils import get_json, get_raw, fetch_json
+from apis.cache import ResponseCache
+from apis.backends import BoundedMemoryCache, SqliteCache
+from apis.policies import DAY
 NWS = "https://api.weather.gov"
+# Coordinates are snapped to this many degrees before /points lookups (NWS grid cells are 2.5 km; 0.01° is ~1.1 km)
+POINT_PRECISION = float(os.environ.get("NWS_POINT_PRECISION","0.01"))
+# Resolved gridpoints persist here across restarts; "" keeps them in memory only
+GRIDPOINTS_DB = os.environ.get("NWS_GRIDPOINTS_DB","nws_gridpoints.db")
+
+logger = logging.getLogger("houston")
+
+def quantize(lat: float, lon: float, precision: float = POINT_PRECISION) -> tuple[float, float]:
+    return round(round(lat / precision) * precision, 4), round(round(lon / precision) * precision, 4)
+
+_gridpoints: ResponseCache | None = None
+
+def gridpoints() -> ResponseCache:
+    """Quantized lat,lon -> gridpoint cache; the SQLite file is its shared tier, so entries survive restarts."""
+    global _gridpoints
+    if _gridpoints is None:
+        store = None
+        if GRIDPOINTS_DB:
+            try:
+                store = SqliteCache(GRIDPOINTS_DB)
+            except Exception as e:
+                logger.warning("NWS gridpoint store %s unavailable, keeping gridpoints in memory: %s", GRIDPOINTS_DB, e)
+        _gridpoints = ResponseCache(BoundedMemoryCache(max_entries=20000, name="nws.gridpoints"), ttl=7 * DAY,
+                                    max_stale=30 * DAY, stale_if_error=90 * DAY, name="nws.gridpoints", shared=store)
+    return _gridpoints
+
+def _gridpoint(meta) -> dict:
+    p = meta["properties"]
+    return {k: p.get(k) for k in ("gridId", "gridX", "gridY", "forecast", "forecastHourly", "forecastGridData",
+                                  "forecastZone", "county", "timeZone")}
+
+async def resolve_gridpoint(lat: float, lon: float) -> dict:
+    qlat, qlon = quantize(lat, lon)
+
+    async def fetch(previous):
+        return _gridpoint(await fetch_json(f"{NWS}/points/{qlat},{qlon}"))
+
+    return await gridpoints().get_or_fetch(f"{qlat},{qlon}", fetch)
 
 async def get_forecast(lat: float, lon: float):
-    meta = await get_json(f"{NWS}/points/{lat},{lon}")
-    forecast_url = meta["properties"]["forecast"]
-    return await get_json(forecast_url)
+    gp = await resolve_gridpoint(lat, lon)
+    return await get_json(gp["forecast"])
 
-async def get_alerts(area: str):
-    return await get_json(f"{NWS}/alerts/active/zone/{area}")
+async def get_alerts(area: str, raw: bool = False):
+    return await (get_raw if raw else get_json)(f"{NWS}/alerts/active/zone/{area}")
 
 def nexrad_tilespec():
     return {
         "template": "https://nowcoast.noaa.gov/arcgis/rest/services/radar/fdradnat/MapServer/tile/{z}/{y}/{x}",
         "attribution": "NOAA nowCOAST"
     }
+
+async def aclose():
+    if _gridpoints is not None:
+        await _gridpoints.aclose()
+        if _gridpoints.shared is not None:
+            await _gridpoints.shared.close()
@@ -1,32 +1,167 @@
 import os
-from apis.utils import get_json
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+from apis.utils import get_json, get_raw
+from apis.geo import GridIndex
 KEY = os.environ.get("PURPLEAIR_API_KEY","")
 BASE = "https://api.purpleair.com/v1/sensors"
 HEADERS = {"X-API-Key": KEY} if KEY else {}
+FIELDS = "name,latitude,longitude,pm2.5_atm,humidity,temperature"
+NUMERIC = ("latitude", "longitude", "pm2.5_atm", "humidity", "temperature")
+# Sensors for this whole region (nwlat,nwlon,selat,selon) are fetched once per cache refresh and indexed;
+# the region itself, bbox queries inside it and nearest-sensor queries are all answered from that one fetch
+REGION = tuple(float(x) for x in os.environ.get("PURPLEAIR_REGION","30.20,-95.90,29.40,-94.90").split(","))
+GRID_CELL_DEG = 0.05
+# Lower bounds (µg/m³) of the EPA PM2.5 AQI categories above "Good" (2024 revision)
+PM25_BREAKPOINTS = {"moderate": 9.1, "unhealthy_sensitive": 35.5, "unhealthy": 55.5,
+                    "very_unhealthy": 125.5, "hazardous": 225.5}
 
-def _rows(resp):
+def sensor_table(resp) -> pa.Table:
+    """Columnar view of a fields/data response: one array per field, no per-row dicts."""
     fields = resp.get('fields', [])
-    for row in resp.get('data', []):
-        yield {fields[i]: row[i] for i in range(len(fields))}
+    data = resp.get('data', [])
+    cols = list(zip(*data)) if data else [()] * len(fields)
+    return pa.table({f: pa.array(col, pa.float64() if f in NUMERIC else None) for f, col in zip(fields, cols)})
 
-async def sensor(sensor_index: int):
+class SensorGrid:
+    """A region's sensor table plus a GridIndex over its coordinates.
+
+    body is the cached upstream body the grid was parsed from (returned as is for raw requests).
+    """
+
+    def __init__(self, resp, body=None):
+        self.resp = resp
+        self.body = body
+        self.table = sensor_table(resp)
+        names = self.table.column_names
+        lats = self.table["latitude"].to_pylist() if "latitude" in names else []
+        lons = self.table["longitude"].to_pylist() if "longitude" in names else []
+        self.index = GridIndex(lats, lons, GRID_CELL_DEG)
+
+    def within(self, nwlat, nwlon, selat, selon) -> pa.Table:
+        return self.table.take(self.index.within(selat, nwlon, nwlat, selon))
+
+    def within_response(self, nwlat, nwlon, selat, selon) -> dict:
+        """The upstream document cut down to the bbox: its own rows, so values keep their upstream types."""
+        data = self.resp["data"]
+        return {**self.resp, "data": [data[i] for i in self.index.within(selat, nwlon, nwlat, selon)]}
+
+    def nearest(self, lat, lon, n) -> pa.Table:
+        hits = self.index.nearest(lat, lon, n)
+        return self.table.take([i for _, i in hits]).append_column("distance_km", pa.array([d for d, _ in hits],
+                                                                                             pa.float64()))
+
+# bbox -> (response, table); the table is rebuilt only when the cache hands back a new response object
+_tables: dict[tuple, tuple] = {}
+_TABLES_MAX = 64
+_grid: SensorGrid | None = None
+
+def _table_for(key, resp) -> pa.Table:
+    hit = _tables.get(key)
+    if hit is not None and hit[0] is resp:
+        return hit[1]
+    table = sensor_table(resp)
+    if len(_tables) >= _TABLES_MAX:
+        _tables.pop(next(iter(_tables)))
+    _tables[key] = (resp, table)
+    return table
+
+def in_region(nwlat, nwlon, selat, selon) -> bool:
+    rnw_lat, rnw_lon, rse_lat, rse_lon = REGION
+    return rse_lat <= selat <= nwlat <= rnw_lat and rnw_lon <= nwlon <= selon <= rse_lon
+
+async def region_grid():
+    """The indexed region, rebuilt when the cached region body changes; an error dict if the fetch failed.
+
+    The region is only ever fetched raw, so raw and parsed requests for it share one cache entry.
+    """
+    global _grid
+    body = await _search(*REGION, raw=True)
+    if isinstance(body, dict):
+        return body
+    if _grid is None or _grid.body is not body:
+        resp = orjson.loads(body.content)
+        if 'data' not in resp:
+            return resp
+        _grid = SensorGrid(resp, body)
+    return _grid
+
+async def sensor(sensor_index: int, raw: bool = False):
     if not KEY:
         return {"error": "Set PURPLEAIR_API_KEY env"}
-    params = {"show": sensor_index, "fields": "name,latitude,longitude,pm2.5_atm,humidity,temperature"}
-    return await get_json(BASE, headers=HEADERS, params=params)
+    params = {"show": sensor_index, "fields": FIELDS}
+    return await (get_raw if raw else get_json)(BASE, headers=HEADERS, params=params)
 
-async def search_bbox(nwlat: float, nwlon: float, selat: float, selon: float):
+async def _search(nwlat, nwlon, selat, selon, raw=False):
     if not KEY:
         return {"error": "Set PURPLEAIR_API_KEY env"}
-    params = {"fields": "name,latitude,longitude,pm2.5_atm,humidity,temperature",
-              "nwlat": nwlat, "nwlon": nwlon, "selat": selat, "selon": selon}
-    return await get_json(BASE, headers=HEADERS, params=params)
+    params = {"fields": FIELDS, "nwlat": nwlat, "nwlon": nwlon, "selat": selat, "selon": selon}
+    return await (get_raw if raw else get_json)(BASE, headers=HEADERS, params=params)
 
-async def top_sensors(nwlat: float, nwlon: float, selat: float, selon: float, limit: int):
-    resp = await search_bbox(nwlat, nwlon, selat, selon)
+async def search_bbox(nwlat: float, nwlon: float, selat: float, selon: float, raw: bool = False):
+    bbox = (nwlat, nwlon, selat, selon)
+    if not in_region(*bbox):
+        return await _search(*bbox, raw=raw)
+    grid = await region_grid()
+    if isinstance(grid, dict):
+        return grid
+    if bbox == REGION:
+        return grid.body if raw else grid.resp
+    return grid.within_response(*bbox)
+
+async def _bbox_table(nwlat, nwlon, selat, selon):
+    if in_region(nwlat, nwlon, selat, selon):
+        grid = await region_grid()
+        return grid if isinstance(grid, dict) else grid.within(nwlat, nwlon, selat, selon)
+    resp = await _search(nwlat, nwlon, selat, selon)
     if 'data' not in resp:
         return resp
-    rows = list(_rows(resp))
-    rows = [r for r in rows if r.get('pm2.5_atm') is not None]
-    rows.sort(key=lambda r: r.get('pm2.5_atm', 0), reverse=True)
-    return {"count": len(rows), "top": rows[:max(1, int(limit))]}
+    return _table_for((nwlat, nwlon, selat, selon), resp)
+
+def top_k(table: pa.Table, field: str, k: int) -> pa.Table:
+    """The k largest non-null values of field, descending, by partial selection."""
+    table = table.filter(pc.is_valid(table[field]))
+    return table.take(pc.select_k_unstable(table, k=min(k, table.num_rows), sort_keys=[(field, "descending")]))
+
+def aggregate(table: pa.Table, field: str, percentiles=(50, 90, 99)) -> dict:
+    col = pc.drop_null(table[field])
+    out = {"field": field, "count": len(col), "mean": None, "median": None, "min": None, "max": None,
+           "percentiles": {}}
+    if len(col):
+        qs = pc.quantile(col, q=[p / 100 for p in percentiles]).to_pylist()
+        mm = pc.min_max(col).as_py()
+        out.update(mean=pc.mean(col).as_py(), median=pc.quantile(col, q=0.5)[0].as_py(), min=mm["min"], max=mm["max"],
+                   percentiles={f"p{p:g}": q for p, q in zip(percentiles, qs)})
+    if field == "pm2.5_atm":
+        out["above"] = {name: pc.sum(pc.greater_equal(col, bp)).as_py() or 0 for name, bp in PM25_BREAKPOINTS.items()}
+    return out
+
+async def top_sensors(nwlat: float, nwlon: float, selat: float, selon: float, limit: int):
+    table = await _bbox_table(nwlat, nwlon, selat, selon)
+    if not isinstance(table, pa.Table):
+        return table
+    top = top_k(table, "pm2.5_atm", max(1, int(limit)))
+    return {"count": pc.count(table["pm2.5_atm"]).as_py(), "top": top.to_pylist()}
+
+async def aggregates(nwlat: float, nwlon: float, selat: float, selon: float, field: str = "pm2.5_atm",
+                     percentiles: str = "50,90,99"):
+    if field not in NUMERIC:
+        return {"error": f"field must be one of {','.join(NUMERIC)}"}
+    try:
+        ps = tuple(float(p) for p in percentiles.split(","))
+    except ValueError:
+        return {"error": "percentiles must be comma-separated numbers"}
+    if any(not 0 <= p <= 100 for p in ps):
+        return {"error": "percentiles must be between 0 and 100"}
+    table = await _bbox_table(nwlat, nwlon, selat, selon)
+    if not isinstance(table, pa.Table):
+        return table
+    return aggregate(table, field, ps)
+
+async def nearest(lat: float, lon: float, n: int = 10):
+    grid = await region_grid()
+    if isinstance(grid, dict):
+        return grid
+    table = grid.nearest(lat, lon, max(1, min(int(n), 100)))
+    return {"count": table.num_rows, "sensors": table.to_pylist()}
@@ -1,11 +1,92 @@
-from apis.utils import get_json
+import os, logging
+import orjson
+from apis.utils import get_json, get_raw, fetch_json, gather_items, split_ids, describe_error
 BASE = "https://api.waterdata.usgs.gov/ogcapi/v0"
+# Streaming mode: features per upstream page, and a hard stop on how many pages one request may follow
+PAGE_SIZE = int(os.environ.get("USGS_PAGE_SIZE","1000"))
+MAX_PAGES = int(os.environ.get("USGS_MAX_PAGES","200"))
 
-async def list_sites(state: str, county: str):
-    url = f"{BASE}/collections/monitoring-locations/items?f=json&state=US:{state}&county=US:48{county}"
-    return await get_json(url)
+logger = logging.getLogger("houston")
 
-async def get_timeseries(site: str, parameter: str, period: str):
-    url = (f"{BASE}/collections/observations/observations?f=json"
-           f"&monitoringLocation=USGS-{site}&parameterCode={parameter}&period={period}")
-    return await get_json(url)
+def _sites_url(state, county):
+    return f"{BASE}/collections/monitoring-locations/items?f=json&state=US:{state}&county=US:48{county}"
+
+def _timeseries_url(site, parameter, period):
+    return (f"{BASE}/collections/observations/observations?f=json"
+            f"&monitoringLocation=USGS-{site}&parameterCode={parameter}&period={period}")
+
+async def list_sites(state: str, county: str, raw: bool = False):
+    return await (get_raw if raw else get_json)(_sites_url(state, county))
+
+async def get_timeseries(site: str, parameter: str, period: str, raw: bool = False):
+    return await (get_raw if raw else get_json)(_timeseries_url(site, parameter, period))
+
+async def get_timeseries_many(sites: str, parameter: str, period: str):
+    return await gather_items(split_ids(sites), lambda site: get_timeseries(site, parameter, period))
+
+async def pages(url: str, page_size: int = PAGE_SIZE, max_pages: int = MAX_PAGES):
+    """Yield each page of an OGC API items response, following rel=next links.
+
+    Pages bypass the response cache and only one is held at a time.
+    """
+    url = f"{url}&limit={page_size}"
+    for _ in range(max_pages):
+        page = await fetch_json(url)
+        yield page
+        url = next((l.get("href") for l in page.get("links", ()) if l.get("rel") == "next"), None)
+        if not url:
+            return
+    logger.warning("stopped following %s after %d pages", url, max_pages)
+
+def _float(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+def compact_observations(features) -> list[dict]:
+    """Observation features -> one {site, parameter_code, unit, time[], value[], approval_status[]} per site."""
+    series: dict[tuple, dict] = {}
+    for f in features:
+        p = f.get("properties") or {}
+        key = (p.get("monitoring_location_id"), p.get("parameter_code"), p.get("unit_of_measure"))
+        s = series.get(key)
+        if s is None:
+            s = series[key] = {"site": key[0], "parameter_code": key[1], "unit": key[2],
+                               "time": [], "value": [], "approval_status": []}
+        s["time"].append(p.get("time"))
+        s["value"].append(_float(p.get("value")))
+        s["approval_status"].append(p.get("approval_status"))
+    return list(series.values())
+
+def compact_site(feature) -> dict:
+    coords = (feature.get("geometry") or {}).get("coordinates") or (None, None)
+    return {"id": feature.get("id"), "lon": coords[0], "lat": coords[1], **(feature.get("properties") or {})}
+
+async def _ndjson(lines):
+    """Encode records as NDJSON; an upstream failure mid-stream ends with an {"error": ...} line."""
+    try:
+        async for rec in lines:
+            yield orjson.dumps(rec) + b"\n"
+    except Exception as e:
+        logger.warning("usgs stream failed: %s", e)
+        yield orjson.dumps({"error": describe_error(e)}) + b"\n"
+
+async def _site_lines(state, county):
+    async for page in pages(_sites_url(state, county)):
+        for f in page.get("features", ()):
+            yield compact_site(f)
+
+async def _timeseries_lines(sites, parameter, period):
+    for site in sites:
+        async for page in pages(_timeseries_url(site, parameter, period)):
+            for s in compact_observations(page.get("features", ())):
+                yield s
+
+def stream_sites(state: str, county: str):
+    """NDJSON, one site per line."""
+    return _ndjson(_site_lines(state, county))
+
+def stream_timeseries(sites: str, parameter: str, period: str):
+    """NDJSON, one compact series chunk per site per upstream page; sites are paged through one after another."""
+    return _ndjson(_timeseries_lines(split_ids(sites), parameter, period))
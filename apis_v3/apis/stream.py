@@ -0,0 +1,106 @@
+import asyncio, logging, time
+import orjson
+from prometheus_client import Gauge, Counter
+
+logger = logging.getLogger("houston")
+
+SUBSCRIBERS = Gauge("stream_subscribers", "Connected push-stream subscribers", ["stream"])
+EVENTS = Counter("stream_events_total", "Events published to push-stream subscribers", ["stream","event"])
+
+HEARTBEAT = 15.0
+QUEUE_SIZE = 32
+
+def sse(event: str, payload: bytes) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + payload + b"\n\n"
+
+class FeedBroadcaster:
+    """One upstream poll loop per feed, fanned out to any number of subscribers as diffs.
+
+    load() returns (version, {entity_id: item}); a new event is published only
+    when the version object changes. Subscribers get a full snapshot on
+    connect, then {"changed": [...], "removed": [...]} deltas. A subscriber that
+    falls QUEUE_SIZE events behind is resynced with a fresh snapshot.
+    """
+
+    def __init__(self, name: str, load, interval: float):
+        self.name = name
+        self.load = load
+        self.interval = interval
+        self.version = None
+        self.items: dict = {}
+        self._subs: set[asyncio.Queue] = set()
+        self._task: asyncio.Task | None = None
+        self._ready = asyncio.Event()
+        self.error: str | None = None  # last poll failure, until a poll succeeds
+
+    def _snapshot(self) -> bytes:
+        return sse("snapshot", orjson.dumps({"timestamp": int(time.time()), "items": list(self.items.values())}))
+
+    def _publish(self, event: str, payload: bytes):
+        EVENTS.labels(self.name, event).inc()
+        for q in list(self._subs):
+            try:
+                q.put_nowait(payload)
+            except asyncio.QueueFull:
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait(self._snapshot())
+
+    async def _poll(self):
+        version, items = await self.load()
+        if version is self.version:
+            return
+        first = self.version is None
+        changed = [v for k, v in items.items() if self.items.get(k) != v]
+        removed = [k for k in self.items if k not in items]
+        self.version, self.items = version, items
+        if first:
+            self._ready.set()
+        elif changed or removed:
+            self._publish("delta", sse("delta", orjson.dumps({"timestamp": int(time.time()),
+                                                              "changed": changed, "removed": removed})))
+
+    async def _run(self):
+        while self._subs:
+            try:
+                await self._poll()
+                self.error = None
+            except Exception as e:
+                self.error = str(e) or type(e).__name__
+                logger.warning("%s poll failed: %s", self.name, e)
+            await asyncio.sleep(self.interval)
+
+    async def subscribe(self):
+        """Async generator of SSE-encoded bytes for one client."""
+        q: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subs.add(q)
+        SUBSCRIBERS.labels(self.name).set(len(self._subs))
+        if self._task is None or self._task.done():
+            # first subscriber after an idle period: start from a fresh snapshot
+            self.version, self.items, self.error = None, {}, None
+            self._ready.clear()
+            self._task = asyncio.ensure_future(self._run())
+        try:
+            # no snapshot until the first successful poll; keep the connection alive (and say why) meanwhile
+            while not self._ready.is_set():
+                try:
+                    await asyncio.wait_for(self._ready.wait(), timeout=HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield sse("error", orjson.dumps({"error": self.error})) if self.error else b": keepalive\n\n"
+            yield self._snapshot()
+            while True:
+                try:
+                    yield await asyncio.wait_for(q.get(), timeout=HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+        finally:
+            self._subs.discard(q)
+            SUBSCRIBERS.labels(self.name).set(len(self._subs))
+            if not self._subs and self._task is not None:
+                self._task.cancel()
+                self._task = None
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -1,24 +1,26 @@
-import os, time, logging, json, asyncio
+import os, time, logging, json, asyncio, hashlib
+from dataclasses import dataclass, replace
+from urllib.parse import urlencode
 import httpx
-from aiocache import cached, SimpleMemoryCache
-from aiolimiter import AsyncLimiter
+import orjson
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from apis.pool import pool, TIMEOUT
+from apis.ratelimit import TokenBucket, parse_retry_after
+from prometheus_client import Counter
+from apis.cache import cache_for, Entry, CACHE_TTL
 
 LOG_LEVEL = os.environ.get("LOG_LEVEL","INFO").upper()
 logging.basicConfig(level=LOG_LEVEL, format='%(message)s')
 logger = logging.getLogger("houston")
 
-TIMEOUT = int(os.environ.get("HTTP_TIMEOUT","30"))
-CACHE_TTL = int(os.environ.get("CACHE_TTL","60"))
-
-# Global limiter (fallback)
+# Global limiter (fallback), shared by hosts without their own budget
 GLOBAL_RPS = float(os.environ.get("RATE_LIMIT_RPS","5"))
-global_limiter = AsyncLimiter(max_rate=GLOBAL_RPS, time_period=1)
+global_limiter = TokenBucket("*", GLOBAL_RPS)
 
-# Per-host limiters
+# Per-host limiters; state is shared across workers when RATE_LIMIT_STATE is set
 limits_json = os.environ.get("RATE_LIMITS_JSON","{}")
 try:
-    PER_HOST = {k: AsyncLimiter(v, 1) for k,v in json.loads(limits_json).items()}
+    PER_HOST = {k: TokenBucket(k, v) for k,v in json.loads(limits_json).items()}
 except Exception:
     PER_HOST = {}
 
@@ -29,24 +31,121 @@ def _limiter_for(url: str):
     except Exception:
         return global_limiter
 
-@retry(reraise=True, stop=stop_after_attempt(3), wait=wait_exponential(multiplier=0.5, min=0.5, max=4),
-       retry=retry_if_exception_type(httpx.HTTPError))
-@cached(ttl=CACHE_TTL, cache=SimpleMemoryCache)
-async def get_json(url: str, headers: dict | None = None, params: dict | None = None):
-    limiter = _limiter_for(url)
-    async with limiter:
-        async with httpx.AsyncClient(timeout=TIMEOUT, headers=headers or {}) as client:
-            r = await client.get(url, params=params or {})
-            r.raise_for_status()
-            return r.json()
+# Batch endpoints: most ids per request, and how many upstream calls one batch keeps in flight
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS","50"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY","8"))
+
+REVALIDATIONS = Counter("upstream_revalidations_total", "Conditional upstream requests by result", ["result"])
+
+def _request_key(kind: str, url: str, headers: dict | None, params: dict | None) -> str:
+    q = urlencode(sorted((params or {}).items()))
+    h = hashlib.sha1(repr(sorted((headers or {}).items())).encode()).hexdigest()[:16] if headers else ""
+    return f"{kind}:{url}?{q}#{h}"
 
 @retry(reraise=True, stop=stop_after_attempt(3), wait=wait_exponential(multiplier=0.5, min=0.5, max=4),
        retry=retry_if_exception_type(httpx.HTTPError))
-@cached(ttl=CACHE_TTL, cache=SimpleMemoryCache)
-async def get_text(url: str, headers: dict | None = None, params: dict | None = None):
+async def _fetch(url: str, headers: dict | None, params: dict | None) -> httpx.Response:
     limiter = _limiter_for(url)
     async with limiter:
-        async with httpx.AsyncClient(timeout=TIMEOUT, headers=headers or {}) as client:
-            r = await client.get(url, params=params or {})
-            r.raise_for_status()
-            return r.text
+        r = await pool.get(url, headers=headers, params=params)
+    if r.status_code in (429, 503):
+        delay = parse_retry_after(r.headers.get("Retry-After"))
+        if delay:
+            await limiter.pause(delay)
+    if r.status_code != 304:
+        r.raise_for_status()
+    return r
+
+async def _fetch_entry(url, headers, params, decode, previous: Entry | None) -> Entry:
+    """Fetch and decode, revalidating `previous` with If-None-Match/If-Modified-Since when it has validators."""
+    conditional = {}
+    if previous is not None:
+        if previous.etag:
+            conditional["If-None-Match"] = previous.etag
+        if previous.last_modified:
+            conditional["If-Modified-Since"] = previous.last_modified
+    r = await _fetch(url, {**(headers or {}), **conditional} if conditional else headers, params)
+    if r.status_code == 304 and previous is not None:
+        REVALIDATIONS.labels("not_modified").inc()
+        return replace(previous, stored_at=time.time())
+    if conditional:
+        REVALIDATIONS.labels("modified").inc()
+    return Entry(decode(r), size=len(r.content), etag=r.headers.get("ETag"),
+                 last_modified=r.headers.get("Last-Modified"))
+
+@dataclass(frozen=True)
+class RawBody:
+    """Upstream body kept as bytes, for endpoints that return it unchanged."""
+    content: bytes
+    media_type: str
+
+def _decode_raw(r: httpx.Response):
+    return RawBody(r.content, r.headers.get("content-type", "application/octet-stream"))
+
+def _decode_json(r: httpx.Response):
+    return orjson.loads(r.content)
+
+def _decode_text(r: httpx.Response):
+    return r.text
+
+async def get_json(url: str, headers: dict | None = None, params: dict | None = None, policy: str | None = None):
+    key = _request_key("json", url, headers, params)
+    return await cache_for(url, policy).get_or_fetch(key, lambda prev: _fetch_entry(url, headers, params, _decode_json, prev))
+
+async def get_text(url: str, headers: dict | None = None, params: dict | None = None, policy: str | None = None):
+    key = _request_key("text", url, headers, params)
+    return await cache_for(url, policy).get_or_fetch(key, lambda prev: _fetch_entry(url, headers, params, _decode_text, prev))
+
+async def get_parsed(url: str, parse, headers: dict | None = None, params: dict | None = None, policy: str | None = None):
+    """Like get_text, but caches parse(text) so parsing runs once per upstream fetch, not once per request."""
+    key = _request_key(f"parsed:{parse.__module__}.{parse.__qualname__}", url, headers, params)
+    decode = lambda r: parse(r.text)
+    return await cache_for(url, policy).get_or_fetch(key, lambda prev: _fetch_entry(url, headers, params, decode, prev))
+
+async def get_raw(url: str, headers: dict | None = None, params: dict | None = None, policy: str | None = None,
+                  max_age: float | None = None) -> RawBody:
+    """max_age: refetch (conditionally) once the cached body is this many seconds old, for poll loops."""
+    key = _request_key("raw", url, headers, params)
+    return await cache_for(url, policy).get_or_fetch(key, lambda prev: _fetch_entry(url, headers, params, _decode_raw, prev),
+                                                     max_age)
+
+async def fetch_json(url: str, headers: dict | None = None, params: dict | None = None):
+    """Uncached get_json (limiter and retries still apply), for paging through results too large to cache."""
+    return orjson.loads((await _fetch(url, headers, params)).content)
+
+def split_ids(value: str) -> list[str]:
+    """"42035, 42019,42035" -> ["42035", "42019"]"""
+    return list(dict.fromkeys(v.strip() for v in value.split(",") if v.strip()))
+
+def describe_error(e: Exception) -> str:
+    if isinstance(e, httpx.HTTPStatusError):
+        return f"upstream HTTP {e.response.status_code}"
+    return f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+
+async def gather_items(ids: list[str], fetch) -> dict:
+    """Run fetch(id) for every id concurrently (BATCH_CONCURRENCY at a time, each still under its host limiter).
+
+    Returns {"count", "results": {id: value}, "errors": {id: message}}; an item
+    fails on its own without failing the batch.
+    """
+    if not ids:
+        return {"error": "No ids given"}
+    if len(ids) > BATCH_MAX_ITEMS:
+        return {"error": f"At most {BATCH_MAX_ITEMS} ids per request"}
+    sem = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def one(i):
+        async with sem:
+            return await fetch(i)
+
+    out = await asyncio.gather(*(one(i) for i in ids), return_exceptions=True)
+    results, errors = {}, {}
+    for i, r in zip(ids, out):
+        if isinstance(r, Exception):
+            logger.warning("batch item %s failed: %s", i, r)
+            errors[i] = describe_error(r)
+        elif isinstance(r, dict) and "error" in r:
+            errors[i] = r["error"]
+        else:
+            results[i] = r
+    return {"count": len(results), "results": results, "errors": errors}
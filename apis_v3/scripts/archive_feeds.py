@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Run the feed archiver as a sidecar (same code as ARCHIVE_ENABLED=true in the API process).
+
+  python scripts/archive_feeds.py [--dir data_parquet] [--once]
+
+--once polls every source a single time, writes what it got and exits
+(for cron / CI instead of a long-running process).
+"""
+import argparse, asyncio, os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from apis import archive, cache
+from apis.pool import pool
+
+async def main(args):
+    a = archive.Archiver(root=args.dir)
+    try:
+        if args.once:
+            for s in a.sources:
+                try:
+                    n = await a.poll(s)
+                    print(f"{s.name:<28}{n:>8} rows")
+                except Exception as e:
+                    print(f"{s.name:<28}  failed: {e}")
+        else:
+            a.start()
+            await asyncio.Event().wait()
+    finally:
+        await a.aclose()
+        await cache.aclose()
+        await pool.aclose()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dir", default=archive.ARCHIVE_DIR)
+    ap.add_argument("--once", action="store_true")
+    try:
+        asyncio.run(main(ap.parse_args()))
+    except KeyboardInterrupt:
+        pass
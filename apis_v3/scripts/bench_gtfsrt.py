@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Benchmark METRO GTFS-rt decoding on a large synthetic FeedMessage.
+
+  python scripts/bench_gtfsrt.py [--vehicles 1500] [--trips 1500] [--stops 30] [--repeat 10]
+
+Compares the v3.1 path (bytes -> latin1 str -> bytes, getattr-chain decode
+on every request) with decode_feed and with decode_cached, which re-uses
+the decoded result while the cached bytes / feed header timestamp are
+unchanged.
+"""
+import argparse, os, sys, time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from google.transit import gtfs_realtime_pb2
+from apis.sources.metro_gtfsrt import decode_feed, decode_cached
+
+def synthetic_feed(vehicles, trips, stops):
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = "2.0"
+    feed.header.timestamp = 1758276000
+    for i in range(vehicles):
+        e = feed.entity.add(id=f"v{i}")
+        v = e.vehicle
+        v.trip.trip_id, v.trip.route_id = f"trip-{i}", str(i % 120)
+        v.position.latitude, v.position.longitude, v.position.bearing = 29.7 + i * 1e-4, -95.4 - i * 1e-4, i % 360
+        v.timestamp, v.stop_id, v.current_stop_sequence = 1758276000 - i, str(1000 + i % 5000), i % 60
+    for i in range(trips):
+        e = feed.entity.add(id=f"t{i}")
+        tu = e.trip_update
+        tu.trip.trip_id, tu.trip.route_id, tu.timestamp = f"trip-{i}", str(i % 120), 1758276000
+        for j in range(stops):
+            u = tu.stop_time_update.add(stop_id=str(1000 + (i + j) % 5000))
+            u.arrival.time = 1758276000 + 60 * j
+            u.departure.time = 1758276030 + 60 * j
+    return feed.SerializeToString()
+
+def decode_feed_v31(raw_bytes):
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.ParseFromString(raw_bytes)
+    entities = []
+    for e in feed.entity:
+        d = {"id": e.id}
+        if e.HasField("vehicle"):
+            v = e.vehicle
+            d["vehicle"] = {
+                "trip_id": getattr(getattr(v, "trip", None), "trip_id", None),
+                "route_id": getattr(getattr(v, "trip", None), "route_id", None),
+                "lat": getattr(getattr(v, "position", None), "latitude", None),
+                "lon": getattr(getattr(v, "position", None), "longitude", None),
+                "bearing": getattr(getattr(v, "position", None), "bearing", None),
+                "timestamp": getattr(v, "timestamp", None),
+                "stop_id": getattr(v, "stop_id", None),
+                "current_stop_sequence": getattr(v, "current_stop_sequence", None),
+            }
+        if e.HasField("trip_update"):
+            tu = e.trip_update
+            d["trip_update"] = {
+                "trip_id": getattr(getattr(tu, "trip", None), "trip_id", None),
+                "route_id": getattr(getattr(tu, "trip", None), "route_id", None),
+                "timestamp": getattr(tu, "timestamp", None),
+                "stops": [{
+                    "stop_id": u.stop_id,
+                    "arrival": getattr(getattr(u, "arrival", None), "time", None),
+                    "departure": getattr(getattr(u, "departure", None), "time", None),
+                } for u in getattr(tu, "stop_time_update", [])]
+            }
+        entities.append(d)
+    return {"entities": entities}
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vehicles", type=int, default=1500)
+    ap.add_argument("--trips", type=int, default=1500)
+    ap.add_argument("--stops", type=int, default=30)
+    ap.add_argument("--repeat", type=int, default=10)
+    args = ap.parse_args()
+    raw = synthetic_feed(args.vehicles, args.trips, args.stops)
+    assert decode_feed(raw) == decode_feed_v31(raw)
+    text = raw.decode("latin1")
+    # distinct bytes objects with the same header timestamp, as after a cache refresh of an unchanged feed
+    versions = [bytes(bytearray(raw)), bytes(bytearray(raw))]
+
+    rows = [
+        ("v3.1: latin1 round trip + decode", lambda: decode_feed_v31(text.encode("latin1"))),
+        ("decode_feed (bytes)", lambda: decode_feed(raw)),
+        ("decode_cached, same cached bytes", lambda: decode_cached("bench", raw)),
+        ("decode_cached, same header ts", lambda: decode_cached("bench", versions.reverse() or versions[0])),
+    ]
+    print(f"feed: {len(raw) / 1024:.0f} KiB, {args.vehicles} vehicles, {args.trips} trip updates x {args.stops} stops")
+    decode_cached("bench", raw)
+    base = None
+    for name, fn in rows:
+        ms = best_of(fn, args.repeat)
+        base = base or ms
+        print(f"{name:<36}{ms:>10.3f} ms{base / ms:>10.1f}x")
+
+if __name__ == "__main__":
+    main()
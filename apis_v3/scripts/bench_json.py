@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Compare stdlib vs orjson JSON paths on realistic apis_v3 payloads.
+
+  python scripts/bench_json.py [--vehicles 2000] [--observations 5000] [--repeat 20]
+
+"encode" is what a route pays per request: FastAPI's jsonable_encoder +
+json.dumps (the old default) vs orjson.dumps (ORJSONRoute).
+"decode" is what get_json pays per upstream fetch: json.loads vs orjson.loads.
+"""
+import argparse, json, random, time
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+def gtfs_vehicles(n):
+    return {"entities": [{
+        "id": f"veh-{i}",
+        "vehicle": {
+            "trip_id": f"trip-{i % 900}", "route_id": str(random.randint(1, 120)),
+            "lat": 29.5 + random.random() * 0.6, "lon": -95.8 + random.random() * 0.8,
+            "bearing": random.random() * 360, "timestamp": 1758276000 + i,
+            "stop_id": str(random.randint(1000, 9999)), "current_stop_sequence": random.randint(1, 60),
+        }} for i in range(n)]}
+
+def usgs_observations(n):
+    return {"type": "FeatureCollection", "numberReturned": n, "features": [{
+        "type": "Feature", "id": f"obs-{i}",
+        "geometry": {"type": "Point", "coordinates": [-95.36, 29.76]},
+        "properties": {"time": f"2025-09-19T{i // 240 % 24:02d}:{i // 4 % 60:02d}:00Z", "value": f"{random.random() * 20:.2f}",
+                       "unit_of_measure": "ft", "parameter_code": "00065", "monitoring_location_id": "USGS-08074000",
+                       "approval_status": "Provisional", "qualifier": None},
+    } for i in range(n)]}
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vehicles", type=int, default=2000)
+    ap.add_argument("--observations", type=int, default=5000)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+    random.seed(42)
+    payloads = {"gtfs-rt vehicles": gtfs_vehicles(args.vehicles), "usgs observations": usgs_observations(args.observations)}
+    print(f"{'payload':<20}{'step':<8}{'stdlib ms':>12}{'orjson ms':>12}{'speedup':>10}")
+    for name, data in payloads.items():
+        body = orjson.dumps(data)
+        enc_std = best_of(lambda: json.dumps(jsonable_encoder(data)).encode(), args.repeat)
+        enc_or = best_of(lambda: orjson.dumps(data), args.repeat)
+        dec_std = best_of(lambda: json.loads(body), args.repeat)
+        dec_or = best_of(lambda: orjson.loads(body), args.repeat)
+        for step, a, b in (("encode", enc_std, enc_or), ("decode", dec_std, dec_or)):
+            print(f"{name:<20}{step:<8}{a:>12.2f}{b:>12.2f}{a / b:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""Merge the archiver's small Parquet files and (optionally) build a DuckDB catalog over them.
+
+  python scripts/compact_duckdb.py [--dir data_parquet] [--min-files 24] [--db archive.duckdb]
+
+Each source=<name>/date=<day> partition is rewritten as one file once the day
+is over (or today's partition has --min-files files). --db writes a DuckDB
+file with one view per source, e.g. SELECT * FROM "nws.alerts" WHERE date = '2025-09-19'.
+"""
+import argparse, os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from apis import archive
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dir", default=archive.ARCHIVE_DIR)
+    ap.add_argument("--min-files", type=int, default=archive.ARCHIVE_COMPACT_MIN_FILES)
+    ap.add_argument("--db")
+    args = ap.parse_args()
+    for part, n in archive.compact(args.dir, min_files=args.min_files).items():
+        print(f"{part}: merged {n} files")
+    if args.db:
+        archive.catalog(args.dir, args.db)
+        print(f"views written to {args.db}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""Consume the MQTT bridge's air-quality-data topic into the store and the Parquet archive.
+
+  python scripts/consume_air_quality.py [--brokers localhost:9092] [--db postgresql://...] [--dir data_parquet]
+                                        [--metrics-port 9108]
+
+Needs `pip install aiokafka`. Readings are written in micro-batches of
+CONSUMER_BATCH_MAX messages or CONSUMER_BATCH_SECONDS; without --db / AIR_QUALITY_DB
+they only go to the archive. Lag, batch size and flush latency are served on
+--metrics-port (0 disables).
+"""
+import argparse, asyncio, os, sys
+from prometheus_client import start_http_server
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from apis import archive, consumer, loader
+
+async def main(args):
+    broker = consumer.KafkaBroker(args.brokers, args.topic, args.group)
+    await broker.start()
+    store = loader.store_from_url(args.db)
+    c = consumer.Consumer(broker, store, args.dir)
+    try:
+        c.start()
+        await asyncio.Event().wait()
+    finally:
+        await c.aclose()
+        if store is not None:
+            store.close()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--brokers", default=consumer.KAFKA_BROKERS)
+    ap.add_argument("--topic", default=consumer.KAFKA_TOPIC)
+    ap.add_argument("--group", default=consumer.KAFKA_GROUP_ID)
+    ap.add_argument("--db", default=loader.AIR_QUALITY_DB)
+    ap.add_argument("--dir", default=archive.ARCHIVE_DIR)
+    ap.add_argument("--metrics-port", type=int, default=9108)
+    args = ap.parse_args()
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
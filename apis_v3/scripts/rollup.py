@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""Fold newly archived readings into the 5min/hour/day rollup tables and exit.
+
+  python scripts/rollup.py [--dir data_parquet] [--db rollups.duckdb]
+
+Same refresh as the API runs every ROLLUP_SECONDS; use one or the other, since
+only one process at a time can open the DuckDB file.
+"""
+import argparse, os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from apis import archive, rollups
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dir", default=archive.ARCHIVE_DIR)
+    ap.add_argument("--db", default=rollups.ROLLUP_DB)
+    args = ap.parse_args()
+    archive.ARCHIVE_DIR = args.dir
+    store = rollups.RollupStore(args.db)
+    for source, n in store.refresh().items():
+        print(f"{source:<28}{n:>8} new rows (watermark {store.watermark(source)})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+import httpx
+from fastapi.testclient import TestClient
+from apis import app as app_mod, utils
+from apis.pool import ClientPool
+
+BODY = b'{"type":"FeatureCollection","features":[{"properties":{"value":"3.1"}}]}'
+
+def test_passthrough_returns_upstream_bytes(monkeypatch):
+    transport = httpx.MockTransport(lambda req: httpx.Response(200, content=BODY,
+                                                               headers={"content-type": "application/geo+json"}))
+    monkeypatch.setattr(utils, "pool", ClientPool(transport=transport))
+    r = TestClient(app_mod.app).get("/usgs/timeseries", params={"site": "08074000", "period": "PT1H"})
+    assert r.status_code == 200
+    assert r.content == BODY
+    assert r.headers["content-type"] == "application/geo+json"
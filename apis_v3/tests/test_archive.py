@@ -0,0 +1,57 @@
+import asyncio
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+from apis import archive
+
+def test_polls_buffer_into_partitioned_parquet_and_compact(tmp_path):
+    polls = iter([[{"id": "a", "delay": 5, "loc": {"x": 1}}], [{"id": "b", "delay": None, "loc": None}],
+                  pa.table({"id": ["c"], "delay": [7]})])
+
+    async def collect():
+        return next(polls)
+
+    src = archive.Source("transtar.incidents", 60, collect)
+    a = archive.Archiver(root=tmp_path, sources=[src], row_group=1000, flush_seconds=600, compact_seconds=0)
+    day1, day2 = 1758240000, 1758240000 + 86400  # 2025-09-19 and -20 UTC
+
+    async def run():
+        assert await a.poll(src, now=day1) == 1
+        await a.poll(src, now=day1 + 60)
+        assert not list(tmp_path.rglob("*.parquet"))  # still buffered
+        await a.poll(src, now=day2)  # new UTC day: the 09-19 buffer is written
+        await a.aclose()
+
+    asyncio.run(run())
+    part = tmp_path / "source=transtar.incidents" / "date=2025-09-19"
+    (f,) = part.glob("*.parquet")
+    t = pq.read_table(f)
+    assert t.column("id").to_pylist() == ["a", "b"] and t.column("loc").to_pylist() == ['{"x":1}', None]
+    assert t.column("fetched_at").to_pylist() == [day1, day1 + 60]
+
+    # a second file for the same (past) day, then compaction merges them into one
+    pq.write_table(pa.table({"id": ["z"], "fetched_at": [day1 + 120]}), part / "extra.parquet")
+    assert archive.compact(tmp_path, today="2025-09-21") == {"source=transtar.incidents/date=2025-09-19": 2}
+    (merged,) = part.glob("*.parquet")
+    assert pq.read_table(merged).num_rows == 3
+
+    db = str(tmp_path / "archive.duckdb")
+    archive.catalog(tmp_path, db)
+    con = duckdb.connect(db)
+    rows = con.execute('SELECT date, count(*) FROM "transtar.incidents" GROUP BY date ORDER BY date').fetchall()
+    con.close()
+    assert [(str(d), n) for d, n in rows] == [("2025-09-19", 3), ("2025-09-20", 1)]
+
+def test_compact_skips_a_broken_partition(tmp_path):
+    bad = tmp_path / "source=nws.alerts" / "date=2025-09-18"
+    good = tmp_path / "source=nws.alerts" / "date=2025-09-19"
+    for part in (bad, good):
+        part.mkdir(parents=True)
+        for i in range(2):
+            pq.write_table(pa.table({"id": [f"{part.name}-{i}"]}), part / f"{i}.parquet")
+    (bad / "2.parquet").write_bytes(b"PAR1 half-written")
+
+    assert archive.compact(tmp_path, today="2025-09-20") == {"source=nws.alerts/date=2025-09-19": 2}
+    assert sorted(f.name for f in bad.iterdir()) == ["0.parquet", "1.parquet", "2.parquet"]  # untouched, no .tmp left
+    (merged,) = good.iterdir()
+    assert pq.read_table(merged)["id"].to_pylist() == ["date=2025-09-19-0", "date=2025-09-19-1"]
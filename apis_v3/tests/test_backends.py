@@ -0,0 +1,54 @@
+import asyncio
+from apis.backends import BoundedMemoryCache, EVICTIONS
+
+def test_lru_bounded_by_entries():
+    c = BoundedMemoryCache(max_entries=2, name="t-lru")
+
+    async def run():
+        await c.set("a", "1")
+        await c.set("b", "2")
+        await c.get("a")  # b is now least recently used
+        await c.set("c", "3")
+        return [await c.get(k) for k in "abc"]
+
+    assert asyncio.run(run()) == ["1", None, "3"]
+    assert EVICTIONS.labels("t-lru", "capacity")._value.get() == 1
+
+def test_bounded_by_bytes_and_oversize():
+    c = BoundedMemoryCache(max_bytes=10, name="t-bytes")
+
+    async def run():
+        await c.set("a", b"12345")
+        await c.set("b", b"12345")
+        await c.set("c", b"123")
+        assert await c.set("huge", b"x" * 11) is False
+        return [await c.get(k) for k in ("a", "b", "c", "huge")]
+
+    assert asyncio.run(run()) == [None, b"12345", b"123", None]
+    assert c.bytes == 8 and len(c) == 2
+
+def test_lfu_keeps_hot_keys():
+    c = BoundedMemoryCache(max_entries=2, eviction="lfu", name="t-lfu")
+
+    async def run():
+        await c.set("hot", 1)
+        await c.set("cold", 2)
+        for _ in range(3):
+            await c.get("hot")
+        await c.get("cold")  # cold is most recent, but used less
+        await c.set("new", 3)
+        return await c.get("hot"), await c.get("cold")
+
+    assert asyncio.run(run()) == (1, None)
+
+def test_ttl_expires_lazily():
+    c = BoundedMemoryCache(name="t-ttl")
+
+    async def run():
+        await c.set("a", 1, ttl=0.01)
+        assert await c.exists("a")
+        await asyncio.sleep(0.02)
+        return await c.get("a")
+
+    assert asyncio.run(run()) is None
+    assert len(c) == 0
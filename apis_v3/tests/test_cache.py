@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from apis.cache import ResponseCache
+
+def _counter(*values):
+    it = iter(values)
+
+    async def fetch(previous):
+        v = next(it)
+        if isinstance(v, Exception):
+            raise v
+        return v
+    return fetch
+
+def test_fresh_hit_does_not_refetch():
+    c = ResponseCache(ttl=60, max_stale=0, stale_if_error=0)
+    fetch = _counter(1, 2)
+
+    async def run():
+        return [await c.get_or_fetch("k", fetch), await c.get_or_fetch("k", fetch)]
+
+    assert asyncio.run(run()) == [1, 1]
+
+def test_stale_served_while_revalidating():
+    c = ResponseCache(ttl=0, max_stale=60, stale_if_error=0)
+    fetch = _counter(1, 2, 3)
+
+    async def run():
+        first = await c.get_or_fetch("k", fetch)
+        stale = await c.get_or_fetch("k", fetch)
+        await asyncio.gather(*c._refreshing)
+        refreshed = await c.get_or_fetch("k", fetch)
+        await c.aclose()
+        return first, stale, refreshed
+
+    assert asyncio.run(run()) == (1, 1, 2)
+
+def test_stale_if_error_and_bound():
+    c = ResponseCache(ttl=0, max_stale=0, stale_if_error=60)
+
+    async def run():
+        await c.get_or_fetch("k", _counter(1))
+        assert await c.get_or_fetch("k", _counter(RuntimeError("upstream down"))) == 1
+        c.stale_if_error = 0
+        with pytest.raises(RuntimeError):
+            await c.get_or_fetch("k", _counter(RuntimeError("upstream down")))
+
+    asyncio.run(run())
+
+def test_policy_table_matches_sources():
+    from apis.policies import policy_for
+    from apis.cache import cache_for
+    assert policy_for("https://api.weather.gov/points/29.76,-95.37").name == "nws.points"
+    assert policy_for("https://api.weather.gov/gridpoints/HGX/65,97/forecast").name == "nws.forecast"
+    assert policy_for("https://api.waterdata.usgs.gov/ogcapi/v0/collections/observations/observations?f=json").name == "usgs.observations"
+    assert policy_for("https://example.com/feed", "metro.gtfsrt").ttl == 15
+    assert policy_for("https://example.com/unknown").name == "default"
+    assert policy_for("https://api.weather.gov/points/1,2").ttl > policy_for("https://api.weather.gov/alerts/active").ttl
+    assert cache_for("https://api.weather.gov/points/1,2") is cache_for("https://api.weather.gov/points/3,4")
+    assert cache_for("https://api.weather.gov/points/1,2") is not cache_for("https://api.weather.gov/alerts/x")
+
+def test_two_level_lookup_shares_fetches_across_workers(tmp_path):
+    from apis.backends import shared_backend
+    for url in ("memory://", f"sqlite://{tmp_path}/l2.db"):
+        l2 = shared_backend(url)
+        worker_a = ResponseCache(ttl=60, name="t", shared=l2)
+        worker_b = ResponseCache(ttl=60, name="t", shared=l2)
+
+        async def run():
+            a = await worker_a.get_or_fetch("k", _counter({"v": 1}))
+            b = await worker_b.get_or_fetch("k", _counter(RuntimeError("should not be fetched")))
+            promoted = await worker_b.backend.get("k")
+            await l2.close()
+            return a, b, promoted.value
+
+        assert asyncio.run(run()) == ({"v": 1}, {"v": 1}, {"v": 1})
+
+def test_max_age_refetches_inline_instead_of_serving_stale():
+    c = ResponseCache(ttl=60, max_stale=60, stale_if_error=0)
+    fetch = _counter(1, 2, 3)
+
+    async def run():
+        first = await c.get_or_fetch("k", fetch)
+        cached = await c.get_or_fetch("k", fetch, max_age=60)
+        polled = await c.get_or_fetch("k", fetch, max_age=0)
+        after = await c.get_or_fetch("k", fetch)
+        return first, cached, polled, after, len(c._refreshing)
+
+    assert asyncio.run(run()) == (1, 1, 2, 2, 0)
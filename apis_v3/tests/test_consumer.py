@@ -0,0 +1,103 @@
+import asyncio
+import duckdb
+import pyarrow.parquet as pq
+from apis import consumer, loader
+
+def _reading(device, ts, pm25=10.0, **extra):
+    return {"device_id": device, "timestamp": ts, "pm25": pm25, "pm10": 20.0, "temperature": 25.0, "humidity": 50.0,
+            "source_topic": f"sensors/{device}", **extra}
+
+def test_micro_batches_dedup_and_write_store_and_archive(tmp_path):
+    broker = consumer.InMemoryBroker(partitions=2)
+    store = loader.DuckDBStore(duckdb.connect())
+    c = consumer.Consumer(broker, store, tmp_path, max_records=4, max_seconds=0.2)
+    for r in [_reading("d1", 1000), _reading("d2", 1000), _reading("d1", 1000), _reading("d1", 2000, pm25=50.0)]:
+        broker.produce(r, key=r["device_id"])
+    broker.produce(b"not json", key="d3")
+    broker.produce(_reading("d3", None, ingestion_timestamp=3000), key="d3")
+
+    async def run():
+        first = await c.run_once()  # count-bounded: 4 of the 6 messages
+        second = await c.run_once()  # time-bounded: the 2 left
+        assert await c.run_once() is None
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first["messages"] == 4 and second["messages"] == 2
+    assert first["written"] + second["written"] == 3  # one duplicate, one bad pm25 > pm10, one undecodable
+    assert {**first["rejected"], **second["rejected"]} == {"pm25_le_pm10": 1}
+    assert broker.committed == [len(log) for log in broker.logs] and asyncio.run(broker.lag()) == {0: 0, 1: 0}
+    stored = store.conn.execute("SELECT device_id, epoch_ms(time) FROM air_quality ORDER BY ALL").fetchall()
+    assert stored == [("d1", 1000), ("d2", 1000), ("d3", 3000)]
+
+    broker.produce(_reading("d2", 1000), key="d2")  # sent again by the bridge
+    assert asyncio.run(c.run_once())["written"] == 0
+    files = sorted(tmp_path.glob("source=air_quality/date=*/*.parquet"))
+    archived = sorted(r for f in files for r in pq.read_table(f, columns=["device_id", "timestamp"]).to_pylist()
+                      for r in [(r["device_id"], r["timestamp"])])
+    assert archived == [("d1", 1000), ("d2", 1000), ("d3", 3000)]
+    assert "fetched_at" in pq.read_schema(files[0]).names
+
+class _FailingOnce:
+    def __init__(self, store):
+        self.store, self.calls = store, 0
+
+    def write(self, table):
+        self.calls += 1
+        if self.calls == 1:
+            raise OSError("database went away")
+        return self.store.write(table)
+
+def test_failed_batch_is_retried_before_committing(tmp_path):
+    broker = consumer.InMemoryBroker()
+    store = _FailingOnce(loader.DuckDBStore(duckdb.connect()))
+    c = consumer.Consumer(broker, store, None, max_records=10, max_seconds=0.1)
+    broker.produce(_reading("d1", 1000), key="d1")
+
+    async def run():
+        try:
+            await c.run_once()
+        except OSError:
+            pass
+        assert broker.committed == [0]  # nothing acknowledged yet
+        return await c.run_once()
+
+    assert asyncio.run(run())["merged"] == 1 and broker.committed == [1]
+
+class _CommitFailsOnce(consumer.InMemoryBroker):
+    failed = False
+
+    async def commit(self, offsets):
+        if not self.failed:
+            self.failed = True
+            raise ConnectionError("coordinator not available")
+        await super().commit(offsets)
+
+def test_commit_failure_after_archive_write_does_not_duplicate_readings(monkeypatch, tmp_path):
+    from apis import archive, rollups
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+    broker = _CommitFailsOnce()
+    c = consumer.Consumer(broker, None, tmp_path, max_records=10, max_seconds=0.1)
+    for ts in (1000, 2000):
+        broker.produce(_reading("d1", ts), key="d1")
+
+    async def run():
+        try:
+            await c.run_once()
+        except ConnectionError:
+            pass
+        return await c.run_once()  # the same batch again, now committed
+
+    assert asyncio.run(run())["written"] == 2 and broker.committed == [2]
+    files = list(tmp_path.glob("source=air_quality/date=*/*.parquet"))
+    assert [f.name for f in files] == ["kafka-0.0-1.parquet"]
+
+    # a restarted consumer re-reads from an older commit and cuts the batch differently: a second file
+    broker.positions = [0]
+    c2 = consumer.Consumer(broker, None, tmp_path, max_records=1, max_seconds=0.1)
+    asyncio.run(c2.run_once())
+    assert len(list(tmp_path.glob("source=air_quality/date=*/*.parquet"))) == 2
+    store = rollups.RollupStore(str(tmp_path / "rollups.duckdb"))
+    store.refresh()
+    assert store.con.execute('SELECT n FROM "air_quality_day" WHERE metric = \'pm25\'').fetchall() == [(2,)]
+    asyncio.run(store.aclose())
@@ -0,0 +1,46 @@
+import asyncio, time
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+from apis import archive, history
+
+def _write(root, source, day, table):
+    part = root / f"source={source}" / f"date={day}"
+    part.mkdir(parents=True, exist_ok=True)
+    pq.write_table(table, part / f"{len(list(part.iterdir()))}.parquet")
+
+def _collect(result):
+    async def run():
+        return b"".join([c async for c in result.body])
+    return asyncio.run(asyncio.wait_for(run(), timeout=10))  # a stream that never ends fails instead of hanging
+
+def test_history_queries_stream_ndjson_and_arrow(monkeypatch, tmp_path):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+    now = int(time.time()) // 3600 * 3600
+    today = time.strftime("%Y-%m-%d", time.gmtime(now))
+    _write(tmp_path, "purpleair.region", today, pa.table({
+        "sensor_index": [1, 2, 1, 1], "pm2.5_atm": [10.0, 5.0, 20.0, 30.0], "fetched_at": [now, now, now + 60, now + 120]}))
+    _write(tmp_path, "purpleair.region", "2001-01-01", pa.table({"sensor_index": [1], "pm2.5_atm": [999.0],
+                                                                 "fetched_at": [978307200]}))
+    _write(tmp_path, "transtar.incidents", today, pa.table({
+        "IncidentId": ["a", "a", "b"], "Roadway": ["I-45", "I-45", "I-10"], "fetched_at": [now, now + 300, now]}))
+
+    assert {s["source"] for s in history.sources()} == {"purpleair.region", "transtar.incidents"}
+    res = asyncio.run(history.purpleair_pm25(days=7, q=0.5))
+    assert res.media_type == "application/x-ndjson"
+    rows = [orjson.loads(l) for l in _collect(res).splitlines()]
+    assert [(r["sensor_index"], r["pm25"], r["n"]) for r in rows] == [(1, 20.0, 3), (2, 5.0, 1)]  # 2001 is pruned
+
+    res = asyncio.run(history.counts("transtar.incidents", group_by="Roadway", distinct="IncidentId", fmt="arrow"))
+    t = pa.ipc.open_stream(_collect(res)).read_all()
+    assert sorted(zip(t["Roadway"].to_pylist(), t["n"].to_pylist())) == [("I-10", 1), ("I-45", 1)]
+
+    res = asyncio.run(history.rows("transtar.incidents", columns="Roadway", limit=2))
+    assert _collect(res).splitlines() == [b'{"Roadway":"I-45"}', b'{"Roadway":"I-10"}']
+    assert "error" in asyncio.run(history.rows("transtar.incidents", columns="nope"))
+    assert "error" in asyncio.run(history.rows("../etc"))
+
+def test_arrow_stream_carries_dictionary_columns():
+    res = asyncio.run(history.run("SELECT CAST('a' AS ENUM('a', 'b')) AS e, range AS i FROM range(3)", [], "arrow"))
+    t = pa.ipc.open_stream(_collect(res)).read_all()
+    assert pa.types.is_dictionary(t["e"].type) and t["e"].to_pylist() == ["a", "a", "a"]
@@ -0,0 +1,76 @@
+import os, uuid
+from pathlib import Path
+import duckdb
+import pytest
+from apis import loader
+
+SCHEMA_SQL = Path(__file__).resolve().parents[2] / "database" / "schema.sql"
+
+
+CSV = """timestamp,pm25,pm10,temperature,humidity,device_id,health_events
+1758041702000,25.5,45.2,28.3,65.1,houston_sensor_001,2
+1758041762000,30.0,20.0,28.3,65.1,houston_sensor_001,0
+1758041822000,12.0,20.0,28.3,140,houston_sensor_002,0
+1758041702000,25.5,45.2,28.3,65.1,houston_sensor_001,2
+1758041882000,8.0,9.0,-10,50,houston_sensor_002,
+1758041942000,8.0,9.0,20,50,,1
+"""
+
+def test_load_file_validates_stages_and_merges(tmp_path):
+    path = tmp_path / "air_quality_data.csv"
+    path.write_text(CSV)
+    con = duckdb.connect()
+    store = loader.DuckDBStore(con)
+    con.execute("INSERT INTO devices (device_id, device_name, status, last_seen) "
+                "VALUES ('houston_sensor_001', 'Houston East Sensor', 'inactive', '2030-01-01 00:00:00+00')")
+
+    assert [t.num_rows for t in loader.read_batches(path, 4)] == [4, 2]
+    out = loader.load_file(path, store, batch_rows=2)  # three batches; the duplicate is in another than its original
+    assert out == {"rows": 6, "merged": 2, "rejected": {"pm25_le_pm10": 1, "humidity": 1, "device_id": 1}}
+    rows = con.execute("SELECT device_id, epoch_ms(time), pm25, health_events FROM air_quality ORDER BY time").fetchall()
+    assert rows == [("houston_sensor_001", 1758041702000, 25.5, 2), ("houston_sensor_002", 1758041882000, 8.0, 0)]
+    devices = con.execute("SELECT device_id, device_name, status, epoch_ms(last_seen) FROM devices ORDER BY 1").fetchall()
+    assert devices == [("houston_sensor_001", "Houston East Sensor", "active", 1893456000000),  # never moves back
+                       ("houston_sensor_002", "houston_sensor_002", "active", 1758041882000)]
+
+    assert loader.load_file(path, store)["merged"] == 0  # re-loading the file adds nothing
+
+def test_ndjson_from_the_bridge(tmp_path):
+    path = tmp_path / "readings.ndjson"
+    path.write_text('{"timestamp": 1758041702000, "pm25": 25, "pm10": 45.2, "temperature": 28.3, "humidity": 65,'
+                    ' "device_id": "d1", "ingestion_timestamp": 1758041703000, "source_topic": "sensors/d1"}\n')
+    table, rejected = loader.validate(loader.normalize(next(loader.read_batches(path))))
+    assert rejected == {} and table.column_names == loader.SCHEMA.names
+    assert table.to_pylist()[0]["pm25"] == 25.0 and table.to_pylist()[0]["health_events"] == 0
+
+def test_postgres_copy_merge_and_trigger_skip(tmp_path):
+    """Runs against a real server: PG_DSN=postgresql://... with psycopg installed."""
+    pytest.importorskip("psycopg")
+    dsn = os.environ.get("PG_DSN") or pytest.skip("PG_DSN not set")
+    path = tmp_path / "air_quality_data.csv"
+    # the newer reading comes first, in its own batch: the per-row trigger would move last_seen back
+    path.write_text("timestamp,pm25,pm10,temperature,humidity,device_id,health_events\n"
+                    "1758041762000,30.0,45.0,28.3,65.1,houston_sensor_001,1\n"
+                    "1758041702000,25.5,45.2,28.3,65.1,houston_sensor_001,\n")
+    store = loader.PostgresStore(dsn)
+    schema = f"loader_test_{uuid.uuid4().hex[:8]}"
+    ddl = "\n".join(l for l in SCHEMA_SQL.read_text().splitlines() if not l.startswith("GRANT"))
+    with store.conn.transaction():
+        store.conn.execute(f"CREATE SCHEMA {schema}")
+        store.conn.execute(f"SET search_path TO {schema}, public")
+        store.conn.execute(ddl)
+    try:
+        assert loader.load_file(path, store, batch_rows=1) == {"rows": 2, "merged": 2, "rejected": {}}  # 2 transactions
+        assert loader.load_file(path, store)["merged"] == 0  # rowcount of a merge that skips everything
+        rows = store.conn.execute("SELECT extract(epoch FROM time) * 1000, health_events FROM air_quality "
+                                  "ORDER BY time").fetchall()
+        assert [(int(t), h) for t, h in rows] == [(1758041702000, 0), (1758041762000, 1)]  # COPY kept ms and UTC
+        last_seen = store.conn.execute("SELECT extract(epoch FROM last_seen) * 1000 FROM devices "
+                                       "WHERE device_id = 'houston_sensor_001'").fetchone()[0]
+        assert int(last_seen) == 1758041762000
+        assert store.conn.execute("SELECT count(*) FROM pg_temp.air_quality_stage").fetchone()[0] == 0
+    finally:
+        store.conn.rollback()
+        with store.conn.transaction():
+            store.conn.execute(f"DROP SCHEMA {schema} CASCADE")
+        store.close()
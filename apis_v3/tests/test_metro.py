@@ -0,0 +1,57 @@
+from google.transit import gtfs_realtime_pb2
+from apis.sources import metro_gtfsrt
+
+def feed_bytes(ts, vehicles=(("v1", "trip-1", "82", 29.76, -95.37),), trips=()):
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = "2.0"
+    feed.header.timestamp = ts
+    for vid, trip_id, route_id, lat, lon in vehicles:
+        v = feed.entity.add(id=vid).vehicle
+        v.trip.trip_id, v.trip.route_id = trip_id, route_id
+        v.position.latitude, v.position.longitude = lat, lon
+        v.timestamp = ts
+    for tid, trip_id, route_id, stops in trips:
+        tu = feed.entity.add(id=tid).trip_update
+        tu.trip.trip_id, tu.trip.route_id = trip_id, route_id
+        for stop_id, arrival in stops:
+            u = tu.stop_time_update.add(stop_id=stop_id)
+            u.arrival.time, u.departure.time = arrival, arrival + 30
+    return feed.SerializeToString()
+
+def test_decode_feed_shape():
+    out = metro_gtfsrt.decode_feed(feed_bytes(100, trips=[("t1", "trip-1", "82", [("S1", 1000)])]))
+    v, t = out["entities"]
+    assert v["vehicle"]["route_id"] == "82" and abs(v["vehicle"]["lat"] - 29.76) < 1e-4
+    assert t["trip_update"]["stops"] == [{"stop_id": "S1", "arrival": 1000, "departure": 1030}]
+
+def test_decode_cached_once_per_feed_version():
+    assert metro_gtfsrt._header_timestamp(feed_bytes(1758276000)) == 1758276000
+    first = metro_gtfsrt.decode_cached("test://vp", feed_bytes(100))
+    same_version = metro_gtfsrt.decode_cached("test://vp", feed_bytes(100, vehicles=()))
+    newer = metro_gtfsrt.decode_cached("test://vp", feed_bytes(101, vehicles=()))
+    assert same_version is first and len(first.result["entities"]) == 1
+    assert newer.timestamp == 101 and newer.result["entities"] == []
+
+def test_filter_vehicles_on_columns():
+    vehicles = [("v1", "trip-1", "82", 29.76, -95.37), ("v2", "trip-2", "82", 29.99, -95.60),
+                ("v3", "trip-3", "402", 29.75, -95.36)]
+    d = metro_gtfsrt.decode_cached("test://filter", feed_bytes(200, vehicles=vehicles))
+    t = metro_gtfsrt.filter_vehicles(d.vehicles, route_id="82")
+    assert t["id"].to_pylist() == ["v1", "v2"]
+    t = metro_gtfsrt.filter_vehicles(d.vehicles, bbox="-95.4,29.7,-95.3,29.8", fields="id,route_id")
+    assert t.to_pylist() == [{"id": "v1", "route_id": "82"}, {"id": "v3", "route_id": "402"}]
+    t = metro_gtfsrt.filter_vehicles(d.vehicles, route_id="82,402", bbox="-95.4,29.7,-95.3,29.8")
+    assert t.num_rows == 2
+
+def test_stop_index_next_arrivals():
+    trips = [("t1", "trip-1", "82", [("S1", 1300), ("S2", 1400)]), ("t2", "trip-2", "402", [("S1", 1100)]),
+             ("t3", "trip-3", "82", [("S1", 900)])]
+    d = metro_gtfsrt.decode_cached("test://tu", feed_bytes(1000, vehicles=(), trips=trips))
+    assert [r[0] for r in d.stops["S1"][1]] == ["trip-2", "trip-1"]  # trip-3 left before the feed was built
+    got = metro_gtfsrt.next_arrivals(d.stops, "S1", after=1000)
+    assert [a["trip_id"] for a in got] == ["trip-2", "trip-1"]
+    assert metro_gtfsrt.next_arrivals(d.stops, "S1", after=1200, limit=5) == [
+        {"trip_id": "trip-1", "route_id": "82", "arrival": 1300, "departure": 1330}]
+    assert metro_gtfsrt.next_arrivals(d.stops, "nope", after=0) == []
+    capped = metro_gtfsrt.stop_index(d.result["entities"], depth=1)
+    assert capped["S1"] == ([900], [("trip-3", "82", 900, 930)])
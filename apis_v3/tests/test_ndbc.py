@@ -0,0 +1,69 @@
+from apis.sources import ndbc
+
+LATEST_OBS = """Station 42035
+29° 13.9' N  94° 24.8' W
+
+04:50 am CDT
+0950 GMT 09/19/25
+
+Wind: SE (140°), 11.7 kt
+Gust: 13.6 kt
+Seas: MM
+Peak Period: 6 sec
+Pres: 30.02 falling
+Air Temp: 82.4 °F
+Water Temp: 84.2 °F
+Dew Point: 76.6 °F
+"""
+
+REALTIME2 = """#YY  MM DD hh mm WDIR WSPD GST  WVHT   DPD   APD MWD   PRES  ATMP  WTMP  DEWP  VIS PTDY  TIDE
+#yr  mo dy hr mn degT m/s  m/s     m   sec   sec degT   hPa  degC  degC  degC  nmi  hPa    ft
+2025 09 19 09 50 140  6.0  7.0    MM    MM    MM  MM 1016.6  28.0  29.0  24.8   MM -0.7    MM
+2025 09 19 09 40 130  5.0  6.0    MM    MM    MM  MM 1016.7  28.0  29.0  24.8   MM -0.7    MM
+"""
+
+def test_parse_latest_obs_typed_with_missing():
+    obs = ndbc.parse_latest_obs(LATEST_OBS)
+    assert obs["time"] == 1758275400
+    assert round(obs["lat"], 3) == 29.232 and round(obs["lon"], 3) == -94.413
+    assert obs["wind_dir"] == "SE" and obs["wind_dir_deg"] == 140 and obs["wind_speed_kt"] == 11.7
+    assert obs["wave_height_ft"] is None and obs["pressure_in"] == 30.02 and obs["pressure_tendency"] == "falling"
+    assert obs["air_temp_f"] == 82.4 and obs["dominant_period_s"] == 6
+
+WAVES = """Station 42035
+0950 GMT 09/19/25
+
+Seas: 3.0 ft
+Peak Period: 6 sec
+Swell: 2.3 ft
+Period: 6.7 sec
+Direction: SE
+Wind Wave: 1.6 ft
+Period: 3.4 sec
+Direction: E
+"""
+
+def test_parse_latest_obs_keeps_swell_and_wind_wave_periods_apart():
+    obs = ndbc.parse_latest_obs(WAVES)
+    assert obs["swell_height_ft"] == 2.3 and obs["swell_period_s"] == 6.7
+    assert obs["wind_wave_height_ft"] == 1.6 and obs["wind_wave_period_s"] == 3.4
+    assert obs["dominant_period_s"] == 6
+    h = ndbc.ObsHistory()
+    h.record("42035", obs)
+    assert h.table("42035", fields=["swell_period_s", "wind_wave_period_s"]).to_pylist()[0] == {
+        "time": obs["time"], "swell_period_s": 6.7, "wind_wave_period_s": 3.4}
+
+def test_parse_fixed_width_takes_newest_row():
+    obs = ndbc.parse_latest_obs(REALTIME2)
+    assert obs["time"] == 1758275400 and obs["wind_speed_ms"] == 6.0
+    assert obs["wave_height_m"] is None and obs["pressure_hpa"] == 1016.6 and obs["tide_ft"] is None
+
+def test_history_appends_new_observations_only():
+    h = ndbc.ObsHistory(max_rows=2)
+    assert h.record("42035", {"time": 100, "wind_speed_kt": 10.0})
+    assert not h.record("42035", {"time": 100, "wind_speed_kt": 10.0})
+    h.record("42035", {"time": 200, "wind_speed_kt": None})
+    h.record("42035", {"time": 300, "wind_speed_kt": 14.0})
+    t = h.table("42035", fields=["wind_speed_kt"])
+    assert t.to_pydict() == {"time": [200, 300], "wind_speed_kt": [None, 14.0]}
+    assert ndbc.trend([0, 3600, 7200], [1.0, None, 3.0]) == {"min": 1.0, "max": 3.0, "mean": 2.0, "slope_per_hour": 1.0}
@@ -0,0 +1,37 @@
+import asyncio
+import httpx
+from apis import utils
+from apis.pool import ClientPool
+from apis.sources import nws_nowcast
+
+def test_nearby_points_share_one_persisted_gridpoint(monkeypatch, tmp_path):
+    calls = []
+
+    def handler(req):
+        calls.append(req.url.path)
+        if req.url.path.startswith("/points/"):
+            return httpx.Response(200, json={"properties": {"gridId": "HGX", "gridX": 65, "gridY": 97,
+                                                            "forecast": "https://api.weather.gov/gridpoints/HGX/65,97/forecast"}})
+        return httpx.Response(200, json={"properties": {"periods": [{"name": "Tonight"}]}})
+
+    monkeypatch.setattr(nws_nowcast, "GRIDPOINTS_DB", str(tmp_path / "gridpoints.db"))
+
+    async def run():
+        p = ClientPool(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(utils, "pool", p)
+        monkeypatch.setattr(nws_nowcast, "_gridpoints", None)
+        a = await nws_nowcast.get_forecast(29.7604, -95.3698)
+        b = await nws_nowcast.get_forecast(29.7611, -95.3702)
+        await nws_nowcast.aclose()
+        # "restart": fresh in-process cache, same SQLite file
+        monkeypatch.setattr(nws_nowcast, "_gridpoints", None)
+        gp = await nws_nowcast.resolve_gridpoint(29.7598, -95.3700)
+        await nws_nowcast.aclose()
+        await p.aclose()
+        return a, b, gp
+
+    a, b, gp = asyncio.run(run())
+    assert a == b and a["properties"]["periods"][0]["name"] == "Tonight"
+    assert calls == ["/points/29.76,-95.37", "/gridpoints/HGX/65,97/forecast"]
+    assert (gp["gridId"], gp["gridX"], gp["gridY"]) == ("HGX", 65, 97)
+    assert nws_nowcast.quantize(29.76049, -95.36951) == (29.76, -95.37)
@@ -0,0 +1,66 @@
+import asyncio, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+from apis import pool as pool_mod
+from apis.pool import ClientPool
+
+def test_one_client_per_host_and_timeouts(monkeypatch):
+    monkeypatch.setitem(pool_mod.PER_HOST_TIMEOUT, "api.weather.gov", 7.0)
+    seen = []
+    urls = []
+    transport = httpx.MockTransport(lambda req: seen.append(req.url.host) or urls.append(str(req.url))
+                                    or httpx.Response(200, json={"ok": True}))
+    p = ClientPool(transport=transport)
+
+    async def run():
+        a = p.client_for("https://api.weather.gov/alerts")
+        assert p.client_for("https://api.weather.gov/points/1,2") is a
+        assert p.client_for("https://api.purpleair.com/v1/sensors") is not a
+        assert a.timeout.read == 7.0
+        r = await p.get("https://api.weather.gov/alerts", headers={"X": "1"}, params={"area": "TXZ213"})
+        assert r.json() == {"ok": True}
+        await p.get("https://api.weather.gov/alerts?area=TXZ214")  # query in the URL survives params=None
+        assert set(p.stats()) == {"api.weather.gov", "api.purpleair.com"}
+        # MockTransport has no connection pool and sends no trace events
+        assert p.stats()["api.weather.gov"] == {"opened": 0, "reused": 0, "open": None, "idle": None}
+        p.update_metrics()
+        await p.aclose()
+        assert p.stats() == {}
+
+    asyncio.run(run())
+    assert seen == ["api.weather.gov"] * 2
+    assert urls == ["https://api.weather.gov/alerts?area=TXZ213", "https://api.weather.gov/alerts?area=TXZ214"]
+
+class _KeepAlive(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def test_stats_count_real_connections():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAlive)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    p = ClientPool()
+
+    async def run():
+        await p.get(url + "a")
+        await p.get(url + "b")
+        stats = p.stats()
+        await p.aclose()
+        return stats
+
+    try:
+        stats = asyncio.run(run())
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert stats == {"127.0.0.1": {"opened": 1, "reused": 1, "open": 1, "idle": 1}}
@@ -0,0 +1,86 @@
+import asyncio
+import httpx
+import orjson
+from apis import utils
+from apis.pool import ClientPool
+from apis.sources import purpleair
+
+RESP = {"api_version": "V1.0.11", "time_stamp": 1758276000, "data_time_stamp": 1758275940, "fields": ["sensor_index", "name", "latitude", "longitude", "pm2.5_atm", "humidity", "temperature"],
+        "data": [[1, "a", 29.7, -95.3, 4.0, 60, 80], [2, "b", 29.8, -95.4, None, 61, 81],
+                 [3, "c", 29.9, -95.5, 40.0, 62, 82], [4, "d", 29.6, -95.2, 12, 63, 83],
+                 [5, "e", 29.5, -95.1, 130.5, 64, 84]]}
+
+def test_top_k_skips_nulls_and_sorts_descending():
+    t = purpleair.sensor_table(RESP)
+    assert t.num_rows == 5 and t["pm2.5_atm"].type == "double"
+    assert purpleair.top_k(t, "pm2.5_atm", 2)["sensor_index"].to_pylist() == [5, 3]
+    assert purpleair.top_k(t, "pm2.5_atm", 10).num_rows == 4
+    assert purpleair.top_k(purpleair.sensor_table({"fields": RESP["fields"], "data": []}), "pm2.5_atm", 5).num_rows == 0
+
+def test_aggregate_percentiles_and_breakpoints():
+    out = purpleair.aggregate(purpleair.sensor_table(RESP), "pm2.5_atm", (50, 100))
+    assert out["count"] == 4 and out["min"] == 4.0 and out["max"] == 130.5
+    assert out["median"] == 26.0 and out["percentiles"] == {"p50": 26.0, "p100": 130.5}
+    assert out["above"] == {"moderate": 3, "unhealthy_sensitive": 2, "unhealthy": 1, "very_unhealthy": 1, "hazardous": 0}
+    assert "above" not in purpleair.aggregate(purpleair.sensor_table(RESP), "humidity")
+
+def test_sub_bbox_and_nearest_answered_from_region_index(monkeypatch):
+    calls = []
+    body = utils.RawBody(orjson.dumps(RESP), "application/json")
+
+    async def search(*bbox, raw=False):
+        calls.append(bbox)
+        return body
+
+    monkeypatch.setattr(purpleair, "_search", search)
+    monkeypatch.setattr(purpleair, "_grid", None)
+
+    async def run():
+        sub = await purpleair.search_bbox(29.85, -95.45, 29.65, -95.25)
+        near = await purpleair.nearest(29.61, -95.21, 2)
+        top = await purpleair.top_sensors(29.95, -95.6, 29.55, -95.15, 1)
+        return sub, near, top
+
+    sub, near, top = asyncio.run(run())
+    assert calls == [purpleair.REGION] * 3
+    assert sub["data"] == RESP["data"][:2] and sub["fields"] == RESP["fields"]  # humidity stays 60, not 60.0
+    assert {k: sub[k] for k in ("api_version", "time_stamp", "data_time_stamp")} == {
+        k: RESP[k] for k in ("api_version", "time_stamp", "data_time_stamp")}
+    assert [s["sensor_index"] for s in near["sensors"]] == [4, 1] and near["sensors"][0]["distance_km"] < 2
+    assert top["top"][0]["sensor_index"] == 3  # sensor 5 is south of this box
+
+def test_region_and_sub_bbox_share_one_upstream_fetch(monkeypatch):
+    calls = []
+
+    async def respond(req):
+        calls.append(str(req.url))
+        return httpx.Response(200, content=orjson.dumps(RESP), headers={"content-type": "application/json"})
+
+    p = ClientPool(transport=httpx.MockTransport(respond))
+    monkeypatch.setattr(utils, "pool", p)
+    monkeypatch.setattr(purpleair, "KEY", "count-upstream-calls")
+    monkeypatch.setattr(purpleair, "HEADERS", {"X-API-Key": "count-upstream-calls"})
+    monkeypatch.setattr(purpleair, "_grid", None)
+
+    async def run():
+        whole = await purpleair.search_bbox(*purpleair.REGION, raw=True)
+        sub = await purpleair.search_bbox(29.85, -95.45, 29.65, -95.25)
+        await p.aclose()
+        return whole, sub
+
+    whole, sub = asyncio.run(run())
+    assert len(calls) == 1
+    assert orjson.loads(whole.content) == RESP
+    assert sub["data"] == RESP["data"][:2] and type(sub["data"][0][5]) is int
+
+def test_grid_nearest_matches_brute_force():
+    import random
+    from apis.geo import GridIndex, distance_km
+    random.seed(7)
+    pts = [(29.4 + random.random() * 0.8, -95.9 + random.random()) for _ in range(2000)]
+    g = GridIndex([p[0] for p in pts], [p[1] for p in pts], 0.05)
+    for lat, lon in [(29.76, -95.37), (29.0, -96.5), (30.19, -94.91)]:
+        want = sorted((distance_km(lat, lon, a, b), i) for i, (a, b) in enumerate(pts))[:7]
+        assert g.nearest(lat, lon, 7) == want
+    box = g.within(29.7, -95.5, 29.8, -95.3)
+    assert box == [i for i, (a, b) in enumerate(pts) if 29.7 <= a <= 29.8 and -95.5 <= b <= -95.3]
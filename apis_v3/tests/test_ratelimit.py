@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from apis.ratelimit import TokenBucket, FileStore, MemoryStore, parse_retry_after
+
+def test_workers_share_one_budget_through_file_store(tmp_path):
+    store = FileStore(str(tmp_path / "limits.json"))
+    worker_a = TokenBucket("api.purpleair.com", rate=10, burst=1, store=store)
+    worker_b = TokenBucket("api.purpleair.com", rate=10, burst=1, store=store)
+
+    async def run():
+        return [await store.update(b.key, b._reserve) for b in (worker_a, worker_b, worker_a, worker_b)]
+
+    waits = asyncio.run(run())
+    assert waits[0] == 0
+    assert waits == sorted(waits)
+    assert waits[3] == pytest.approx(0.3, abs=0.05)
+
+def test_burst_allows_immediate_tokens():
+    bucket = TokenBucket("h", rate=5, store=MemoryStore())
+
+    async def run():
+        return [await bucket.store.update(bucket.key, bucket._reserve) for _ in range(6)]
+
+    waits = asyncio.run(run())
+    assert waits[:5] == [0.0] * 5 and waits[5] > 0
+
+def test_retry_after_pauses_bucket():
+    bucket = TokenBucket("h", rate=100, store=MemoryStore())
+
+    async def run():
+        await bucket.pause(2)
+        return await bucket.store.update(bucket.key, bucket._reserve)
+
+    assert asyncio.run(run()) == pytest.approx(2, abs=0.05)
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    when = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert parse_retry_after(when) == pytest.approx(30, abs=2)
+
+def test_zero_rate_means_no_limit():
+    bucket = TokenBucket("h", rate=0, store=MemoryStore())
+
+    async def run():
+        waits = [await bucket.store.update(bucket.key, bucket._reserve) for _ in range(20)]
+        await bucket.pause(0.5)
+        return waits, await bucket.store.update(bucket.key, bucket._reserve)
+
+    waits, paused = asyncio.run(run())
+    assert waits == [0.0] * 20
+    assert paused == pytest.approx(0.5, abs=0.05)
@@ -0,0 +1,46 @@
+import asyncio
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+from apis import archive, rollups
+
+def _write(root, day, name, table):
+    part = root / "source=air_quality" / f"date={day}"
+    part.mkdir(parents=True, exist_ok=True)
+    pq.write_table(table, part / name)
+
+def _readings(ts_ms, device, pm25, fetched_at):
+    return pa.table({"timestamp": ts_ms, "device_id": device, "pm25": pm25,
+                     "pm10": [2 * v for v in pm25], "fetched_at": fetched_at})
+
+def test_rollups_fold_in_only_new_rows(monkeypatch, tmp_path):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    store = rollups.RollupStore(str(tmp_path / "rollups.duckdb"))
+    t0 = 1_700_000_000_000 // 86_400_000 * 86_400_000  # midnight UTC, in ms
+    _write(tmp_path / "archive", "2023-11-14", "a.parquet", _readings(
+        [t0, t0 + 60_000, t0 + 400_000, t0], ["d1", "d1", "d1", "d2"], [10.0, 20.0, 30.0, 5.0], [t0 // 1000 + 10] * 4))
+
+    assert store.refresh() == {"purpleair.region": 0, "air_quality": 4}
+    assert store.watermark("air_quality") == t0 // 1000 + 10
+    five = store.con.execute('SELECT device, n, min, max, mean FROM "air_quality_5min" '
+                             "WHERE metric = 'pm25' ORDER BY bucket, device").fetchall()
+    assert five == [("d1", 2, 10.0, 20.0, 15.0), ("d2", 1, 5.0, 5.0, 5.0), ("d1", 1, 30.0, 30.0, 30.0)]
+    assert store.refresh()["air_quality"] == 0  # nothing new: tables untouched
+
+    # a reading for the first bucket replayed months later: only (bucket, d1) rows are rebuilt, from all raw rows
+    _write(tmp_path / "archive", "2024-03-01", "b.parquet", _readings([t0 + 120_000], ["d1"], [60.0], [1_709_251_200]))
+    assert store.refresh()["air_quality"] == 1
+    hour = store.con.execute('SELECT device, metric, n, min, max, mean, p50 <= p90 AND p90 <= p99 '
+                             'FROM "air_quality_hour" ORDER BY device, metric').fetchall()
+    assert hour == [("d1", "pm10", 4, 20.0, 120.0, 60.0, True), ("d1", "pm25", 4, 10.0, 60.0, 30.0, True),
+                    ("d2", "pm10", 1, 10.0, 10.0, 10.0, True), ("d2", "pm25", 1, 5.0, 5.0, 5.0, True)]
+
+    monkeypatch.setattr(rollups.history, "HISTORY_MAX_DAYS", 100_000)
+    res = asyncio.run(store.query("air_quality", tier="day", metric="pm25", device="d1", days=100_000))
+    rows = [orjson.loads(l) for l in b"".join(asyncio.run(_collect(res.body))).splitlines()]
+    assert [(r["device"], r["n"], r["max"]) for r in rows] == [("d1", 4, 60.0)]
+    assert "error" in asyncio.run(store.query("air_quality", tier="week"))
+    asyncio.run(store.aclose())
+
+async def _collect(body):
+    return [c async for c in body]
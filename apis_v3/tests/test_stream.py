@@ -0,0 +1,52 @@
+import asyncio
+import orjson
+from apis.stream import FeedBroadcaster
+
+def test_snapshot_then_deltas_from_one_poll_loop():
+    versions = [
+        {"a": {"id": "a", "lat": 1}, "b": {"id": "b", "lat": 2}},
+        {"a": {"id": "a", "lat": 1}, "b": {"id": "b", "lat": 3}, "c": {"id": "c", "lat": 4}},
+        {"a": {"id": "a", "lat": 1}, "c": {"id": "c", "lat": 4}},
+    ]
+    polls = []
+
+    async def load():
+        polls.append(1)
+        items = versions[min(len(polls), len(versions)) - 1]
+        return items, items
+
+    def parse(event):
+        name, data = event.decode().strip().split("\n")
+        return name.removeprefix("event: "), orjson.loads(data.removeprefix("data: "))
+
+    async def run():
+        b = FeedBroadcaster("test", load, interval=0.01)
+        one, two = b.subscribe(), b.subscribe()
+        got_one = [parse(await one.__anext__()) for _ in range(3)]
+        got_two = parse(await two.__anext__())
+        await one.aclose()
+        await two.aclose()
+        return got_one, got_two, b._task
+
+    got_one, got_two, task = asyncio.run(run())
+    (kind, snap), (k1, d1), (k2, d2) = got_one
+    assert kind == "snapshot" and [i["id"] for i in snap["items"]] == ["a", "b"]
+    assert k1 == "delta" and d1["changed"] == [{"id": "b", "lat": 3}, {"id": "c", "lat": 4}] and d1["removed"] == []
+    assert k2 == "delta" and d2["changed"] == [] and d2["removed"] == ["b"]
+    assert got_two[0] == "snapshot"
+    assert task is None
+
+def test_failing_first_poll_still_sends_heartbeats_and_errors(monkeypatch):
+    from apis import stream
+    monkeypatch.setattr(stream, "HEARTBEAT", 0.05)
+
+    async def load():
+        raise OSError("upstream down")
+
+    async def run():
+        gen = FeedBroadcaster("test-down", load, interval=0.01).subscribe()
+        first = await asyncio.wait_for(gen.__anext__(), timeout=2)
+        await gen.aclose()
+        return first
+
+    assert asyncio.run(run()) == b'event: error\ndata: {"error":"upstream down"}\n\n'
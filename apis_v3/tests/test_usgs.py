@@ -0,0 +1,46 @@
+import asyncio
+import httpx
+import orjson
+from apis import utils
+from apis.pool import ClientPool
+from apis.sources import usgs_water
+
+def _obs(site, t, v):
+    return {"type": "Feature", "properties": {"monitoring_location_id": site, "parameter_code": "00065",
+                                              "unit_of_measure": "ft", "time": t, "value": v, "approval_status": "Provisional"}}
+
+def test_stream_follows_next_links_as_compact_ndjson(monkeypatch):
+    base = "https://api.waterdata.usgs.gov/ogcapi/v0/collections/observations/observations"
+    seen = []
+
+    def handler(req):
+        seen.append(req.url)
+        if req.url.params.get("page") == "2":
+            return httpx.Response(200, json={"features": [_obs("USGS-08074000", "t3", "bad")], "links": []})
+        return httpx.Response(200, json={"features": [_obs("USGS-08074000", "t1", "1.5"), _obs("USGS-08074000", "t2", "1.7")],
+                                         "links": [{"rel": "self", "href": "x"}, {"rel": "next", "href": f"{base}?page=2"}]})
+
+    p = ClientPool(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(utils, "pool", p)
+
+    async def run():
+        chunks = [c async for c in usgs_water.stream_timeseries("08074000", "00065", "P30D")]
+        await p.aclose()
+        return chunks
+
+    lines = [orjson.loads(c) for c in asyncio.run(run())]
+    assert seen[0].params["limit"] == str(usgs_water.PAGE_SIZE) and len(seen) == 2
+    assert lines[0] == {"site": "USGS-08074000", "parameter_code": "00065", "unit": "ft", "time": ["t1", "t2"],
+                        "value": [1.5, 1.7], "approval_status": ["Provisional", "Provisional"]}
+    assert lines[1]["value"] == [None]
+
+def test_stream_ends_with_error_line(monkeypatch):
+    async def boom(url, headers=None, params=None):
+        raise httpx.ConnectError("refused")
+
+    monkeypatch.setattr(usgs_water, "fetch_json", boom)
+
+    async def run():
+        return [c async for c in usgs_water.stream_sites("TX", "201")]
+
+    assert [orjson.loads(c) for c in asyncio.run(run())] == [{"error": "ConnectError: refused"}]
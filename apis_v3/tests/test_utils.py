@@ -0,0 +1,92 @@
+import asyncio
+import httpx
+from apis import utils, cache
+from apis.pool import ClientPool
+
+def _mock_pool(monkeypatch, handler):
+    calls = []
+
+    async def respond(req):
+        calls.append(str(req.url))
+        await asyncio.sleep(0.01)
+        return handler(req)
+
+    p = ClientPool(transport=httpx.MockTransport(respond))
+    monkeypatch.setattr(utils, "pool", p)
+    return p, calls
+
+def test_concurrent_misses_share_one_fetch(monkeypatch):
+    p, calls = _mock_pool(monkeypatch, lambda req: httpx.Response(200, json={"alerts": [1, 2]}))
+    before = cache.FLIGHTS.labels("coalesced")._value.get()
+
+    async def run():
+        res = await asyncio.gather(*[utils.get_json("https://api.weather.gov/alerts/sf", params={"area": "TXZ213"})
+                                     for _ in range(10)])
+        await p.aclose()
+        return res
+
+    res = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(r == {"alerts": [1, 2]} for r in res)
+    assert cache.FLIGHTS.labels("coalesced")._value.get() - before == 9
+    assert cache._inflight == {}
+
+def test_request_key_distinguishes_params_and_headers():
+    k = utils._request_key
+    assert k("json", "u", None, {"a": 1, "b": 2}) == k("json", "u", None, {"b": 2, "a": 1})
+    assert k("json", "u", None, {"a": 1}) != k("json", "u", None, {"a": 2})
+    assert k("json", "u", {"X-API-Key": "a"}, None) != k("json", "u", {"X-API-Key": "b"}, None)
+    assert "X-API-Key" not in k("json", "u", {"X-API-Key": "secret"}, None)
+
+def test_conditional_get_reuses_decoded_entry(monkeypatch):
+    def handler(req):
+        if req.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, json={"features": [1]}, headers={"ETag": '"v1"', "Last-Modified": "Fri, 19 Sep 2025 10:00:00 GMT"})
+
+    p, calls = _mock_pool(monkeypatch, handler)
+    decoded = []
+
+    def decode(r):
+        decoded.append(r)
+        return r.json()
+
+    async def run():
+        url = "https://api.weather.gov/alerts/active/zone/TXZ213"
+        first = await utils._fetch_entry(url, None, None, decode, None)
+        second = await utils._fetch_entry(url, None, None, decode, first)
+        await p.aclose()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.etag == '"v1"' and first.last_modified
+    assert second.value is first.value and second.stored_at >= first.stored_at
+    assert len(calls) == 2 and len(decoded) == 1
+
+def test_gather_items_reports_partial_failures():
+    async def fetch(station):
+        if station == "bad":
+            raise httpx.ConnectError("refused")
+        if station == "nokey":
+            return {"error": "Set KEY env"}
+        return {"station": station}
+
+    out = asyncio.run(utils.gather_items(utils.split_ids("42035, bad,42019,42035,nokey"), fetch))
+    assert out["results"] == {"42035": {"station": "42035"}, "42019": {"station": "42019"}}
+    assert out["errors"] == {"bad": "ConnectError: refused", "nokey": "Set KEY env"} and out["count"] == 2
+    assert "error" in asyncio.run(utils.gather_items([str(i) for i in range(utils.BATCH_MAX_ITEMS + 1)], fetch))
+
+def test_metar_batch_is_one_upstream_call(monkeypatch):
+    from apis.sources import aviation
+    p, calls = _mock_pool(monkeypatch, lambda req: httpx.Response(200, json=[
+        {"icaoId": "KIAH", "rawOb": "KIAH 1"}, {"icaoId": "KHOU", "rawOb": "KHOU 1"}, {"icaoId": "KIAH", "rawOb": "KIAH 0"}]))
+
+    async def run():
+        out = await aviation.get_metars("kiah,KHOU,KXXX")
+        await p.aclose()
+        return out
+
+    out = asyncio.run(run())
+    assert len(calls) == 1 and "ids=KIAH,KHOU,KXXX" in calls[0]
+    assert [r["rawOb"] for r in out["results"]["KIAH"]] == ["KIAH 1", "KIAH 0"]
+    assert out["errors"] == {"KXXX": "No METAR returned"}
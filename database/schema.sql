@@ -118,6 +118,12 @@ ORDER BY claim_date DESC;
 CREATE OR REPLACE FUNCTION validate_air_quality_reading()
 RETURNS TRIGGER AS $$
 BEGIN
+    -- Bulk loads (apis_v3/apis/loader.py) validate and upsert devices once per batch instead;
+    -- they SET LOCAL houston.bulk_load = 'on' for their own transaction only
+    IF current_setting('houston.bulk_load', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+
     -- Validate PM2.5 vs PM10 relationship (PM2.5 should be <= PM10)
     IF NEW.pm25 > NEW.pm10 THEN
         RAISE EXCEPTION 'PM2.5 cannot be greater than PM10';